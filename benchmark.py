@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import des
+
+KEY = "benchkey"
+IV = bytes(range(8))
+
+DEFAULT_SIZES = "8,64,1K,64K,1M"
+DEFAULT_BACKENDS = "scalar,numpy"
+
+# name -> (method, input kind). Input kinds: 'plain' is the raw payload,
+# 'ecb'/'cbc'/'pcbc' are padded ciphertexts of it, 'stream' is the payload
+# itself (CFB, OFB and CTR decryption take ciphertext of the same length).
+CASES = {
+    'encrypt_ecb': ('encrypt_ecb', 'plain'),
+    'decrypt_ecb': ('decrypt_ecb', 'ecb'),
+    'encrypt_cbc': ('encrypt_cbc', 'plain'),
+    'decrypt_cbc': ('decrypt_cbc', 'cbc'),
+    'encrypt_cfb': ('encrypt_cfb', 'plain'),
+    'decrypt_cfb': ('decrypt_cfb', 'stream'),
+    'encrypt_ofb': ('encrypt_ofb', 'plain'),
+    'decrypt_ofb': ('decrypt_ofb', 'stream'),
+    'encrypt_pcbc': ('encrypt_pcbc', 'plain'),
+    'decrypt_pcbc': ('decrypt_pcbc', 'pcbc'),
+    'encrypt_ctr': ('encrypt_ctr', 'plain'),
+    'decrypt_ctr': ('decrypt_ctr', 'stream'),
+}
+
+# Only these run on the parallel backend; the others are sequential
+PARALLEL_CASES = ('encrypt_ecb', 'decrypt_ecb', 'decrypt_cbc', 'encrypt_ctr', 'decrypt_ctr')
+
+def parse_size(text):
+    # "64", "64K", "1M" -> bytes
+    text = text.strip().upper()
+    scale = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}.get(text[-1:], 1)
+    size = int(text[:-1] if scale > 1 else text) * scale
+    if size <= 0 or size % 8:
+        raise argparse.ArgumentTypeError(f"Payload size must be a positive multiple of 8 bytes: {text}")
+    return size
+
+def time_call(fn, repeat):
+    # Best time for one call, running enough calls per sample to get past
+    # timer resolution on small payloads
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def make_inputs(cipher, payload):
+    padded = des._pad(payload)
+    return {
+        'plain': payload,
+        'ecb': cipher.encrypt(padded),
+        'cbc': cipher.encrypt_cbc(padded, IV),
+        'pcbc': cipher.encrypt_pcbc(payload, IV),
+        'stream': payload,
+    }
+
+def bench_modes(sizes, backends, cases, repeat, workers):
+    results = []
+    cipher = des.DES(KEY)
+    default_threshold = des.NUMPY_MIN_BYTES
+    for backend in backends:
+        if backend == 'numpy' and not des._numpy_tables():
+            print("Skipping numpy backend: NumPy is not installed.", file=sys.stderr)
+            continue
+        engine = cipher
+        if backend == 'parallel':
+            engine = des.ParallelDES(KEY, workers=workers, min_parallel_bytes=0)
+        des.NUMPY_MIN_BYTES = float('inf') if backend == 'scalar' else default_threshold
+        try:
+            for size in sizes:
+                inputs = make_inputs(cipher, os.urandom(size))
+                for name in cases:
+                    if backend == 'parallel' and name not in PARALLEL_CASES:
+                        continue
+                    method_name, kind = CASES[name]
+                    method = getattr(engine, method_name)
+                    data = inputs[kind]
+                    if name.endswith('_ecb'):
+                        fn = lambda: method(data)
+                    else:
+                        fn = lambda: method(data, IV)
+                    seconds = time_call(fn, repeat)
+                    results.append({
+                        'name': name,
+                        'backend': backend,
+                        'size': size,
+                        'seconds': seconds,
+                        'blocks_per_sec': (size / 8) / seconds,
+                        'mb_per_sec': size / seconds / 1e6,
+                    })
+                    print(f"{name:>13} {backend:>8} {size:>10} B  {size / seconds / 1e6:10.3f} MB/s",
+                          file=sys.stderr)
+        finally:
+            des.NUMPY_MIN_BYTES = default_threshold
+            if backend == 'parallel':
+                engine.close()
+    return results
+
+def bench_key_setup(repeat):
+    # Cold: the key schedule cache is disabled. Warm: every call is a hit.
+    info = des.key_cache_info()
+    try:
+        des.set_key_cache_size(0)
+        cold = time_call(lambda: des.DES(KEY), repeat)
+        des.set_key_cache_size(max(info['maxsize'], 1))
+        des.DES(KEY)
+        warm = time_call(lambda: des.DES(KEY), repeat)
+    finally:
+        des.set_key_cache_size(info['maxsize'])
+    return {'cold_seconds': cold, 'warm_seconds': warm}
+
+def bench_import(repeat):
+    # Fresh interpreter per sample so des.py is imported cold. The stdlib
+    # modules des.py needs are imported first, as any real caller has them
+    # already. first_block_seconds adds the first DES construction (which
+    # builds the derived tables) and one block: the cold-start cost.
+    code = ("import io, os, struct, threading, array, functools, collections, time; "
+            "t = time.perf_counter(); import des; i = time.perf_counter() - t; "
+            "des.DES('benchkey').encrypt(bytes(8)); print(i, time.perf_counter() - t)")
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=here, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append(tuple(float(x) for x in output.split()))
+    return {'seconds': min(s[0] for s in samples),
+            'first_block_seconds': min(s[1] for s in samples)}
+
+def run(args):
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': bench_modes(args.sizes, args.backends, args.cases, args.repeat, args.workers),
+    }
+    if not args.skip_key_setup:
+        report['key_setup'] = bench_key_setup(args.repeat)
+    if not args.skip_import:
+        report['import'] = bench_import(args.repeat)
+    return report
+
+def compare(report, baseline, threshold):
+    # Returns a list of human-readable regressions: throughput below, or
+    # key setup/import time above, the baseline by more than threshold
+    regressions = []
+    old = {(r['name'], r['backend'], r['size']): r for r in baseline.get('results', [])}
+    for result in report['results']:
+        before = old.get((result['name'], result['backend'], result['size']))
+        if before and result['mb_per_sec'] < before['mb_per_sec'] * (1 - threshold):
+            regressions.append(
+                f"{result['name']} [{result['backend']}, {result['size']} B]: "
+                f"{result['mb_per_sec']:.3f} MB/s vs {before['mb_per_sec']:.3f} MB/s")
+    timings = [('key_setup', 'cold_seconds'), ('key_setup', 'warm_seconds'), ('import', 'seconds'),
+               ('import', 'first_block_seconds')]
+    for section, field in timings:
+        before = baseline.get(section, {}).get(field)
+        after = report.get(section, {}).get(field)
+        if before and after and after > before * (1 + threshold):
+            regressions.append(f"{section}.{field}: {after * 1e3:.3f} ms vs {before * 1e3:.3f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DES modes, payload sizes and backends.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        type=lambda s: [parse_size(x) for x in s.split(',')],
+                        help=f"Comma-separated payload sizes, e.g. 8,1K,256M (default: {DEFAULT_SIZES}).")
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS, type=lambda s: s.split(','),
+                        help=f"Comma-separated backends: scalar, numpy, parallel (default: {DEFAULT_BACKENDS}).")
+    parser.add_argument("--cases", default=','.join(CASES), type=lambda s: s.split(','),
+                        help="Comma-separated mode methods to run (default: all).")
+    parser.add_argument("--repeat", type=int, default=3, help="Samples per measurement; the best is kept.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for the parallel backend.")
+    parser.add_argument("--skip-key-setup", action="store_true", help="Do not measure DES construction.")
+    parser.add_argument("--skip-import", action="store_true", help="Do not measure cold import of des.py.")
+    parser.add_argument("-o", "--output", help="Write the JSON report to this file instead of stdout.")
+    parser.add_argument("--compare", metavar="BASELINE", help="Baseline JSON report to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Allowed slowdown against the baseline as a fraction (default: 0.10).")
+
+    args = parser.parse_args()
+
+    for name in args.cases:
+        if name not in CASES:
+            parser.error(f"Unknown case: {name}")
+    for backend in args.backends:
+        if backend not in ('scalar', 'numpy', 'parallel'):
+            parser.error(f"Unknown backend: {backend}")
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f_out:
+            f_out.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f_in:
+            baseline = json.load(f_in)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
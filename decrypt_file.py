@@ -1,13 +1,231 @@
 import argparse
+import glob
+import math
+import os
 import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from des import DES
 
+# Default read size for streaming decryption, a multiple of the 8-byte block
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Modes that need no IV. des1-cbc is the format `des -k KEY` writes (and the
+# Lambda handler reads), des1-ecb what `des -b` writes, ecb plain ECB with
+# PKCS#5 padding.
+MODES = ('des1-cbc', 'des1-ecb', 'ecb')
+DEFAULT_MODE = 'des1-cbc'
+
+def decrypt_stream(des, f_in, f_out, chunk_size=DEFAULT_CHUNK_SIZE, mode=DEFAULT_MODE):
+    # Decrypts a stream chunk by chunk, writing each chunk as soon as it is
+    # ready. The decryptor holds back only the final block until EOF so its
+    # padding can be stripped, so memory use stays at about one chunk.
+    # Returns the number of plaintext bytes written.
+    if chunk_size <= 0 or chunk_size % 8:
+        raise ValueError("Chunk size must be a positive multiple of 8 bytes.")
+    decryptor = des.decryptor(mode)
+    written = 0
+    while True:
+        data = f_in.read(chunk_size)
+        if not data:
+            break
+        written += f_out.write(decryptor.update(data))
+    written += f_out.write(decryptor.finalize())
+    return written
+
+def decrypt_file_atomic(des, in_path, out_path, chunk_size=DEFAULT_CHUNK_SIZE, mode=DEFAULT_MODE):
+    # Decrypts into a temporary file next to out_path and renames it into
+    # place, so out_path is either absent, the old file or complete
+    def decrypt(tmp_path):
+        with open(in_path, 'rb') as f_in, open(tmp_path, 'wb') as f_out:
+            decrypt_stream(des, f_in, f_out, chunk_size, mode)
+    _replace_atomic(out_path, decrypt)
+
+def decrypt_file_mmap_atomic(des, in_path, out_path, mode=DEFAULT_MODE):
+    # The same through memory maps: the temporary file is the one mapped
+    _replace_atomic(out_path, lambda tmp_path: des.decrypt_file(in_path, mode, out_path=tmp_path))
+
+def _replace_atomic(out_path, write):
+    # Calls write(tmp_path) and renames the temporary file over out_path;
+    # on any failure the temporary file is removed and out_path untouched
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=f".{os.path.basename(out_path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# Batch mode. Each worker process builds its DES object (and key schedule)
+# once in the pool initializer and reuses it for every file it is given.
+
+_worker_des = None
+_worker_chunk_size = DEFAULT_CHUNK_SIZE
+_worker_mode = DEFAULT_MODE
+
+def _init_worker(key, debug, chunk_size, mode):
+    global _worker_des, _worker_chunk_size, _worker_mode
+    _worker_des = DES(key, debug_mode=debug)
+    _worker_chunk_size = chunk_size
+    _worker_mode = mode
+
+def _decrypt_job(in_path, out_path):
+    # Returns (input bytes, seconds)
+    start = time.perf_counter()
+    decrypt_file_atomic(_worker_des, in_path, out_path, _worker_chunk_size, _worker_mode)
+    return os.path.getsize(in_path), time.perf_counter() - start
+
+def output_path_for(in_path, output_dir):
+    # Same naming as the Lambda handler: extension replaced with .dec
+    base_name = os.path.splitext(os.path.basename(in_path))[0]
+    return os.path.join(output_dir, f"{base_name}.dec")
+
+def collect_jobs(inputs, output_dir, manifest):
+    # Returns a list of (input, output) pairs from directories, globs and
+    # files given on the command line plus an optional manifest file with one
+    # "input<TAB>output" pair per line (blank lines and # comments ignored).
+    # Files the expansion finds that are themselves outputs (the .dec files
+    # of an earlier run into the same directory) are left out. Raises
+    # ValueError when two jobs share an output or an output would overwrite
+    # an input, since the workers would clobber each other.
+    found = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            paths = sorted(os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            paths = sorted(glob.glob(pattern)) or [pattern]
+        found.extend(path for path in paths if os.path.isfile(path))
+    jobs = [(path, output_path_for(path, output_dir)) for path in found]
+    outputs = {_real(out_path) for _, out_path in jobs}
+    jobs = [job for job in jobs if _real(job[0]) not in outputs]
+    origins = [in_path for in_path, _ in jobs]
+    if manifest:
+        with open(manifest) as f_manifest:
+            for line_no, line in enumerate(f_manifest, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                fields = line.split('\t') if '\t' in line else line.split()
+                if len(fields) != 2:
+                    raise ValueError(f"{manifest}:{line_no}: expected an input and an output path")
+                jobs.append((fields[0], fields[1]))
+                origins.append(f"{manifest}:{line_no}")
+    check_jobs(jobs, origins)
+    return jobs
+
+def _real(path):
+    return os.path.normcase(os.path.realpath(path))
+
+def check_jobs(jobs, origins):
+    # origins[i] names where jobs[i] came from (an input path or manifest line)
+    inputs = {}
+    for (in_path, _), origin in zip(jobs, origins):
+        inputs.setdefault(_real(in_path), origin)
+    outputs = {}
+    for (in_path, out_path), origin in zip(jobs, origins):
+        target = _real(out_path)
+        if target == _real(in_path):
+            raise ValueError(f"{origin}: output '{out_path}' is the input itself")
+        if target in inputs:
+            raise ValueError(f"{origin}: output '{out_path}' is the input of {inputs[target]}")
+        if target in outputs:
+            raise ValueError(f"{origin}: output '{out_path}' is also the output of {outputs[target]}")
+        outputs[target] = origin
+
+def is_up_to_date(in_path, out_path):
+    try:
+        return os.path.getmtime(out_path) >= os.path.getmtime(in_path)
+    except OSError:
+        return False
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_batch(key, jobs, workers=None, debug=False, chunk_size=DEFAULT_CHUNK_SIZE, skip_up_to_date=False,
+              mode=DEFAULT_MODE):
+    # Decrypts every (input, output) pair on a process pool and returns a
+    # summary dict with counts, throughput and latency percentiles
+    skipped = 0
+    if skip_up_to_date:
+        pending = [job for job in jobs if not is_up_to_date(*job)]
+        skipped = len(jobs) - len(pending)
+        jobs = pending
+
+    failures = []
+    latencies = []
+    total_bytes = 0
+    start = time.perf_counter()
+    if jobs:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(key, debug, chunk_size, mode)) as pool:
+            futures = {pool.submit(_decrypt_job, in_path, out_path): in_path for in_path, out_path in jobs}
+            for future in as_completed(futures):
+                try:
+                    size, seconds = future.result()
+                except Exception as e:
+                    failures.append((futures[future], str(e)))
+                    continue
+                total_bytes += size
+                latencies.append(seconds)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'files': len(latencies),
+        'skipped': skipped,
+        'failures': failures,
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'files_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'mb_per_sec': total_bytes / elapsed / 1e6 if elapsed else 0.0,
+        'latency_p50': percentile(latencies, 0.50),
+        'latency_p90': percentile(latencies, 0.90),
+        'latency_p99': percentile(latencies, 0.99),
+        'latency_max': latencies[-1] if latencies else 0.0,
+    }
+
+def print_report(summary):
+    print(f"Decrypted {summary['files']} files ({summary['bytes']} bytes) in {summary['seconds']:.3f}s, "
+          f"skipped {summary['skipped']} up to date, {len(summary['failures'])} failed.")
+    print(f"Throughput: {summary['files_per_sec']:.2f} files/s, {summary['mb_per_sec']:.3f} MB/s")
+    print(f"Per-file latency: p50={summary['latency_p50'] * 1e3:.1f}ms p90={summary['latency_p90'] * 1e3:.1f}ms "
+          f"p99={summary['latency_p99'] * 1e3:.1f}ms max={summary['latency_max'] * 1e3:.1f}ms")
+    for path, error in summary['failures']:
+        print(f"Error decrypting '{path}': {error}", file=sys.stderr)
+
 def main():
-    parser = argparse.ArgumentParser(description="Decrypt a file using DES (ECB mode).")
+    parser = argparse.ArgumentParser(description="Decrypt a file using DES (des program file format by default).")
     parser.add_argument("-k", "--key", required=True, help="8-byte DES key.")
-    parser.add_argument("encrypted_filename", help="Path to the encrypted input file.")
-    parser.add_argument("decrypted_filename", help="Path to the output file for decrypted content.")
+    parser.add_argument("encrypted_filename", nargs='?', help="Path to the encrypted input file.")
+    parser.add_argument("decrypted_filename", nargs='?', help="Path to the output file for decrypted content.")
     parser.add_argument("--debug", action="store_true", help="Enable debug output for intermediate values.")
+    parser.add_argument("--mode", default=DEFAULT_MODE, choices=MODES,
+                        help=f"File format: des1-cbc as written by des -k, des1-ecb by des -b, ecb for ECB "
+                             f"with PKCS#5 padding (default: {DEFAULT_MODE}).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Bytes read per chunk, a multiple of 8 (default: {DEFAULT_CHUNK_SIZE}).")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Decrypt through memory maps into a pre-sized output file.")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Decrypt the input file in place through a memory map; no output name is given.")
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--batch", nargs='+', metavar="PATH",
+                       help="Directories, globs or files to decrypt into --output-dir.")
+    batch.add_argument("--manifest", help="File of 'input<TAB>output' pairs to decrypt.")
+    batch.add_argument("--output-dir", default=".", help="Output directory for --batch inputs (default: .).")
+    batch.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    batch.add_argument("--skip-up-to-date", action="store_true",
+                       help="Skip outputs newer than their input.")
 
     args = parser.parse_args()
 
@@ -15,28 +233,62 @@ def main():
         print("Error: Key must be exactly 8 bytes long.", file=sys.stderr)
         sys.exit(1)
 
-    try:
-        with open(args.encrypted_filename, 'rb') as f_in:
-            encrypted_data = f_in.read()
-    except FileNotFoundError:
+    if args.batch or args.manifest:
+        if args.encrypted_filename or args.decrypted_filename:
+            parser.error("positional file names cannot be combined with --batch/--manifest")
+        try:
+            os.makedirs(args.output_dir, exist_ok=True)
+            jobs = collect_jobs(args.batch or [], args.output_dir, args.manifest)
+        except (OSError, ValueError) as e:
+            print(f"Error collecting input files: {e}", file=sys.stderr)
+            sys.exit(1)
+        summary = run_batch(args.key, jobs, args.workers, args.debug, args.chunk_size, args.skip_up_to_date,
+                            args.mode)
+        print_report(summary)
+        sys.exit(1 if summary['failures'] else 0)
+
+    if args.in_place:
+        if not args.encrypted_filename or args.decrypted_filename:
+            parser.error("--in-place takes exactly one file name")
+        try:
+            des = DES(args.key, debug_mode=args.debug)
+            des.decrypt_file(args.encrypted_filename, args.mode)
+        except FileNotFoundError:
+            print(f"Error: Encrypted file '{args.encrypted_filename}' not found.", file=sys.stderr)
+            sys.exit(1)
+        except Exception as e:
+            print(f"Error during decryption: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"File '{args.encrypted_filename}' decrypted in place successfully.")
+        return
+
+    if not args.encrypted_filename or not args.decrypted_filename:
+        parser.error("an input and an output file name are required without --batch/--manifest")
+
+    if args.mmap:
+        if not os.path.exists(args.encrypted_filename):
+            print(f"Error: Encrypted file '{args.encrypted_filename}' not found.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            des = DES(args.key, debug_mode=args.debug)
+            # As in the default path, a failure leaves the previous output alone
+            decrypt_file_mmap_atomic(des, args.encrypted_filename, args.decrypted_filename, args.mode)
+        except Exception as e:
+            print(f"Error during decryption: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"File '{args.encrypted_filename}' decrypted to '{args.decrypted_filename}' successfully.")
+        return
+
+    if not os.path.exists(args.encrypted_filename):
         print(f"Error: Encrypted file '{args.encrypted_filename}' not found.", file=sys.stderr)
         sys.exit(1)
-    except Exception as e:
-        print(f"Error reading encrypted file: {e}", file=sys.stderr)
-        sys.exit(1)
 
     try:
         des = DES(args.key.encode('latin-1').decode('latin-1'), debug_mode=args.debug)
-        
-        encrypted_str = encrypted_data.decode('latin-1')
-        decrypted_str = des.decrypt_ecb(encrypted_str)
 
-        # For this specific test, we assume no padding and exactly 8 bytes.
-        decrypted_data = decrypted_str.encode('latin-1')
+        # A failure partway leaves the previous output (if any) untouched
+        decrypt_file_atomic(des, args.encrypted_filename, args.decrypted_filename, args.chunk_size, args.mode)
 
-        with open(args.decrypted_filename, 'wb') as f_out:
-            f_out.write(decrypted_data)
-        
         print(f"File '{args.encrypted_filename}' decrypted to '{args.decrypted_filename}' successfully.")
 
     except Exception as e:
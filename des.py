@@ -1,26 +1,35 @@
 
 # Conversion of the C code to Python
 
+import io
+import os
+import struct
+import threading
+from array import array
+from functools import wraps
+from time import perf_counter_ns
+from collections import OrderedDict
+
 # DES constants
 # Permutation choice 1
-PC1 = [57, 49, 41, 33, 25, 17, 9,
-       1, 58, 50, 42, 34, 26, 18,
-       10, 2, 59, 51, 43, 35, 27,
-       19, 11, 3, 60, 52, 44, 36,
-       63, 55, 47, 39, 31, 23, 15,
-       7, 62, 54, 46, 38, 30, 22,
-       14, 6, 61, 53, 45, 37, 29,
-       21, 13, 5, 28, 20, 12, 4]
+PC1 = bytes((57, 49, 41, 33, 25, 17, 9,
+             1, 58, 50, 42, 34, 26, 18,
+             10, 2, 59, 51, 43, 35, 27,
+             19, 11, 3, 60, 52, 44, 36,
+             63, 55, 47, 39, 31, 23, 15,
+             7, 62, 54, 46, 38, 30, 22,
+             14, 6, 61, 53, 45, 37, 29,
+             21, 13, 5, 28, 20, 12, 4))
 
 # Permutation choice 2
-PC2 = [14, 17, 11, 24, 1, 5,
-       3, 28, 15, 6, 21, 10,
-       23, 19, 12, 4, 26, 8,
-       16, 7, 27, 20, 13, 2,
-       41, 52, 31, 37, 47, 55,
-       30, 40, 51, 45, 33, 48,
-       44, 49, 39, 56, 34, 53,
-       46, 42, 50, 36, 29, 32]
+PC2 = bytes((14, 17, 11, 24, 1, 5,
+             3, 28, 15, 6, 21, 10,
+             23, 19, 12, 4, 26, 8,
+             16, 7, 27, 20, 13, 2,
+             41, 52, 31, 37, 47, 55,
+             30, 40, 51, 45, 33, 48,
+             44, 49, 39, 56, 34, 53,
+             46, 42, 50, 36, 29, 32))
 
 # Initial Permutation
 # This will be applied to the 64-bit block formed by (L << 32) | R
@@ -45,17 +54,17 @@ FP = [
 ]
 
 # Expansion D-box
-E = [32, 1, 2, 3, 4, 5,
-     4, 5, 6, 7, 8, 9,
-     8, 9, 10, 11, 12, 13,
-     12, 13, 14, 15, 16, 17,
-     16, 17, 18, 19, 20, 21,
-     20, 21, 22, 23, 24, 25,
-     24, 25, 26, 27, 28, 29,
-     28, 29, 30, 31, 32, 1]
+E = bytes((32, 1, 2, 3, 4, 5,
+           4, 5, 6, 7, 8, 9,
+           8, 9, 10, 11, 12, 13,
+           12, 13, 14, 15, 16, 17,
+           16, 17, 18, 19, 20, 21,
+           20, 21, 22, 23, 24, 25,
+           24, 25, 26, 27, 28, 29,
+           28, 29, 30, 31, 32, 1))
 
 # S-boxes
-S_BOX = [
+S_BOX = tuple(tuple(bytes(row) for row in box) for box in [
     # S1
     [[14, 4, 13, 1, 2, 15, 11, 8, 3, 10, 6, 12, 5, 9, 0, 7],
      [0, 15, 7, 4, 14, 2, 13, 1, 10, 6, 12, 11, 9, 5, 3, 8],
@@ -96,19 +105,19 @@ S_BOX = [
      [1, 15, 13, 8, 10, 3, 7, 4, 12, 5, 6, 11, 0, 14, 9, 2],
      [7, 11, 4, 1, 9, 12, 14, 2, 0, 6, 10, 13, 15, 3, 5, 8],
      [2, 1, 14, 7, 4, 10, 8, 13, 15, 12, 9, 0, 3, 5, 6, 11]]
-]
+])
 
 # Permutation function
-P = [16, 7, 20, 21, 29, 12, 28, 17,
-     1, 15, 23, 26, 5, 18, 31, 10,
-     2, 8, 24, 14, 32, 27, 3, 9,
-     19, 13, 30, 6, 22, 11, 4, 25]
+P = bytes((16, 7, 20, 21, 29, 12, 28, 17,
+           1, 15, 23, 26, 5, 18, 31, 10,
+           2, 8, 24, 14, 32, 27, 3, 9,
+           19, 13, 30, 6, 22, 11, 4, 25))
 
 # number of left shifts
-SHIFT = [1, 1, 2, 2, 2, 2, 2, 2, 1, 2, 2, 2, 2, 2, 2, 1]
+SHIFT = bytes((1, 1, 2, 2, 2, 2, 2, 2, 1, 2, 2, 2, 2, 2, 2, 1))
 
 # From podd.h
-odd_parity = [
+odd_parity = bytes((
   1,  1,  2,  2,  4,  4,  7,  7,  8,  8, 11, 11, 13, 13, 14, 14,
  16, 16, 19, 19, 21, 21, 22, 22, 25, 25, 26, 26, 28, 28, 31, 31,
  32, 32, 35, 35, 37, 37, 38, 38, 41, 41, 42, 42, 44, 44, 47, 47,
@@ -124,10 +133,10 @@ odd_parity = [
 193,193,194,194,196,196,199,199,200,200,203,203,205,205,206,206,
 208,208,211,211,213,213,214,214,217,217,218,218,220,220,223,223,
 224,224,227,227,229,229,230,230,233,233,234,234,236,236,239,239,
-241,241,242,242,244,244,247,247,248,248,251,251,253,253,254,254]
+241,241,242,242,244,244,247,247,248,248,251,251,253,253,254,254))
 
 # From sk.h
-des_skb = [
+des_skb = tuple(array('I', row) for row in [
 [0x00000000,0x00000010,0x20000000,0x20000010,0x00010000,0x00010010,0x20010000,0x20010010,0x00000800,0x00000810,0x20000800,0x20000810,0x00010800,0x00010810,0x20010800,0x20010810,0x00000020,0x00000030,0x20000020,0x20000030,0x00010020,0x00010030,0x20010020,0x20010030,0x00000820,0x00000830,0x20000820,0x20000830,0x00010820,0x00010830,0x20010820,0x20010830,0x00080000,0x00080010,0x20080000,0x20080010,0x00090000,0x00090010,0x20090000,0x20090010,0x00080800,0x00080810,0x20080800,0x20080810,0x00090800,0x00090810,0x20090800,0x20090810,0x00080020,0x00080030,0x20080020,0x20080030,0x00090020,0x00090030,0x20090020,0x20090030,0x00080820,0x00080830,0x20080820,0x20080830,0x00090820,0x00090830,0x20090820,0x20090830,],
 [0x00000000,0x02000000,0x00002000,0x02002000,0x00200000,0x02200000,0x00202000,0x02202000,0x00000004,0x02000004,0x00002004,0x02002004,0x00200004,0x02200004,0x00202004,0x02202004,0x00000400,0x02000400,0x00002400,0x02002400,0x00200400,0x02200400,0x00202400,0x02202400,0x00000404,0x02000404,0x00002404,0x02002404,0x00200404,0x02200404,0x00202404,0x02202404,0x10000000,0x12000000,0x10002000,0x12002000,0x10200000,0x12200000,0x10202000,0x12202000,0x10000004,0x12000004,0x10002004,0x12002004,0x10200004,0x12200004,0x10202004,0x12202004,0x10000400,0x12000400,0x10002400,0x12002400,0x10200400,0x12200400,0x10202400,0x12202400,0x10000404,0x12000404,0x10002404,0x12002404,0x10200404,0x12200404,0x10202404,0x12202404,],
 [0x00000000,0x00000001,0x00040000,0x00040001,0x01000000,0x01000001,0x01040000,0x01040001,0x00000002,0x00000003,0x00040002,0x00040003,0x01000002,0x01000003,0x01040002,0x01040003,0x00000200,0x00000201,0x00040200,0x00040201,0x01000200,0x01000201,0x01040200,0x01040201,0x00000202,0x00000203,0x00040202,0x00040203,0x01000202,0x01000203,0x01040202,0x01040203,0x08000000,0x08000001,0x08040000,0x08040001,0x09000000,0x09000001,0x09040000,0x09040001,0x08000002,0x08000003,0x08040002,0x08040003,0x09000002,0x09000003,0x09040002,0x09040003,0x08000200,0x08000201,0x08040200,0x08040201,0x09000200,0x09000201,0x09040200,0x09040201,0x08000202,0x08000203,0x08040202,0x08040203,0x09000202,0x09000203,0x09040202,0x09040203,],
@@ -135,21 +144,559 @@ des_skb = [
 [0x00000000,0x10000000,0x00010000,0x10010000,0x00000004,0x10000004,0x00010004,0x10010004,0x20000000,0x30000000,0x20010000,0x30010000,0x20000004,0x30000004,0x20010004,0x30010004,0x00100000,0x10100000,0x00110000,0x10110000,0x00100004,0x10100004,0x00110004,0x10110004,0x20100000,0x30100000,0x20110000,0x30110000,0x20100004,0x30100004,0x20110004,0x30110004,0x00001000,0x10001000,0x00011000,0x10011000,0x00001004,0x10001004,0x00011004,0x10011004,0x20001000,0x30001000,0x20011000,0x30011000,0x20001004,0x30001004,0x20011004,0x30011004,0x00101000,0x10101000,0x00111000,0x10111000,0x00101004,0x10101004,0x00111004,0x10111004,0x20101000,0x30101000,0x20111000,0x30111000,0x20101004,0x30101004,0x20111004,0x30111004,],
 [0x00000000,0x08000000,0x00000008,0x08000008,0x00000400,0x08000400,0x00000408,0x08000408,0x00020000,0x08020000,0x00020008,0x08020008,0x00020400,0x08020400,0x00020408,0x08020408,0x00000001,0x08000001,0x00000009,0x08000009,0x00000401,0x08000401,0x00000409,0x08000409,0x00020001,0x08020001,0x00020009,0x08020009,0x00020401,0x08020401,0x00020409,0x08020409,0x02000000,0x0A000000,0x02000008,0x0A000008,0x02000400,0x0A000400,0x02000408,0x0A000408,0x02020000,0x0A020000,0x02020008,0x0A020008,0x02020400,0x0A020400,0x02020408,0x0A020408,0x02000001,0x0A000001,0x02000009,0x0A000009,0x02000401,0x0A000401,0x02000409,0x0A000409,0x02020001,0x0A020001,0x02020009,0x0A020009,0x02020401,0x0A020401,0x02020409,0x0A020409,],
 [0x00000000,0x00000100,0x00080000,0x00080100,0x01000000,0x01000100,0x01080000,0x01080100,0x00000010,0x00000110,0x00080010,0x00080110,0x01000010,0x01000110,0x01080010,0x01080110,0x00200000,0x00200100,0x00280000,0x00280100,0x01200000,0x01200100,0x01280000,0x01280100,0x00200010,0x00200110,0x00280010,0x00280110,0x01200010,0x01200110,0x01280010,0x01280110,0x00000200,0x00000300,0x00080200,0x00080300,0x01000200,0x01000300,0x01080200,0x01080300,0x00000210,0x00000310,0x00080210,0x00080310,0x01000210,0x01000310,0x01080210,0x01080310,0x00200200,0x00200300,0x00280200,0x00280300,0x01200200,0x01200300,0x01280200,0x01280300,0x00200210,0x00200310,0x00280210,0x00280310,0x01200210,0x01200310,0x01280210,0x01280310,],
-[0x00000000,0x04000000,0x00040000,0x04040000,0x00000002,0x04000002,0x00040002,0x04040002,0x00002000,0x04002000,0x00042000,0x04042000,0x00002002,0x04002002,0x00042002,0x04042002,0x00000020,0x04000020,0x00040020,0x04040020,0x00000022,0x04000022,0x00040022,0x04040022,0x00002020,0x04002020,0x00042020,0x04042020,0x00002022,0x04002022,0x00042022,0x04042022,0x00000800,0x04000800,0x00040800,0x04040800,0x00000802,0x04000802,0x00040802,0x04040802,0x00002800,0x04002800,0x00042800,0x04042800,0x00002802,0x04002802,0x00042802,0x04042802,0x00000820,0x04000820,0x00040820,0x04040820,0x00000822,0x04000822,0x00040822,0x04040822,0x00002820,0x04002820,0x00042820,0x04042820,0x00002822,0x04002822,0x00042822,0x04042822,]]
+[0x00000000,0x04000000,0x00040000,0x04040000,0x00000002,0x04000002,0x00040002,0x04040002,0x00002000,0x04002000,0x00042000,0x04042000,0x00002002,0x04002002,0x00042002,0x04042002,0x00000020,0x04000020,0x00040020,0x04040020,0x00000022,0x04000022,0x00040022,0x04040022,0x00002020,0x04002020,0x00042020,0x04042020,0x00002022,0x04002022,0x00042022,0x04042022,0x00000800,0x04000800,0x00040800,0x04040800,0x00000802,0x04000802,0x00040802,0x04040802,0x00002800,0x04002800,0x00042800,0x04042800,0x00002802,0x04002802,0x00042802,0x04042802,0x00000820,0x04000820,0x00040820,0x04040820,0x00000822,0x04000822,0x00040822,0x04040822,0x00002820,0x04002820,0x00042820,0x04042820,0x00002822,0x04002822,0x00042822,0x04042822,]])
 
-class DES:
-    def __init__(self, key_str, debug_mode=False):
-        # Convert key string to 8-byte des_cblock (bytearray) using C's des_string_to_key logic
-        self.key_cblock = self._des_string_to_key(key_str)
-        self.subkeys = self._generate_subkeys()
-        self.debug_mode = debug_mode
-        if self.debug_mode:
-            self._debug_print_subkeys()
+# From spr.h
+des_SPtrans = tuple(array('I', row) for row in [
+[0x02080800,0x00080000,0x02000002,0x02080802,0x02000000,0x00080802,0x00080002,0x02000002,0x00080802,0x02080800,0x02080000,0x00000802,0x02000802,0x02000000,0x00000000,0x00080002,0x00080000,0x00000002,0x02000800,0x00080800,0x02080802,0x02080000,0x00000802,0x02000800,0x00000002,0x00000800,0x00080800,0x02080002,0x00000800,0x02000802,0x02080002,0x00000000,0x00000000,0x02080802,0x02000800,0x00080002,0x02080800,0x00080000,0x00000802,0x02000800,0x02080002,0x00000800,0x00080800,0x02000002,0x00080802,0x00000002,0x02000002,0x02080000,0x02080802,0x00080800,0x02080000,0x02000802,0x02000000,0x00000802,0x00080002,0x00000000,0x00080000,0x02000000,0x02000802,0x02080800,0x00000002,0x02080002,0x00000800,0x00080802,],
+[0x40108010,0x00000000,0x00108000,0x40100000,0x40000010,0x00008010,0x40008000,0x00108000,0x00008000,0x40100010,0x00000010,0x40008000,0x00100010,0x40108000,0x40100000,0x00000010,0x00100000,0x40008010,0x40100010,0x00008000,0x00108010,0x40000000,0x00000000,0x00100010,0x40008010,0x00108010,0x40108000,0x40000010,0x40000000,0x00100000,0x00008010,0x40108010,0x00100010,0x40108000,0x40008000,0x00108010,0x40108010,0x00100010,0x40000010,0x00000000,0x40000000,0x00008010,0x00100000,0x40100010,0x00008000,0x40000000,0x00108010,0x40008010,0x40108000,0x00008000,0x00000000,0x40000010,0x00000010,0x40108010,0x00108000,0x40100000,0x40100010,0x00100000,0x00008010,0x40008000,0x40008010,0x00000010,0x40100000,0x00108000,],
+[0x04000001,0x04040100,0x00000100,0x04000101,0x00040001,0x04000000,0x04000101,0x00040100,0x04000100,0x00040000,0x04040000,0x00000001,0x04040101,0x00000101,0x00000001,0x04040001,0x00000000,0x00040001,0x04040100,0x00000100,0x00000101,0x04040101,0x00040000,0x04000001,0x04040001,0x04000100,0x00040101,0x04040000,0x00040100,0x00000000,0x04000000,0x00040101,0x04040100,0x00000100,0x00000001,0x00040000,0x00000101,0x00040001,0x04040000,0x04000101,0x00000000,0x04040100,0x00040100,0x04040001,0x00040001,0x04000000,0x04040101,0x00000001,0x00040101,0x04000001,0x04000000,0x04040101,0x00040000,0x04000100,0x04000101,0x00040100,0x04000100,0x00000000,0x04040001,0x00000101,0x04000001,0x00040101,0x00000100,0x04040000,],
+[0x00401008,0x10001000,0x00000008,0x10401008,0x00000000,0x10400000,0x10001008,0x00400008,0x10401000,0x10000008,0x10000000,0x00001008,0x10000008,0x00401008,0x00400000,0x10000000,0x10400008,0x00401000,0x00001000,0x00000008,0x00401000,0x10001008,0x10400000,0x00001000,0x00001008,0x00000000,0x00400008,0x10401000,0x10001000,0x10400008,0x10401008,0x00400000,0x10400008,0x00001008,0x00400000,0x10000008,0x00401000,0x10001000,0x00000008,0x10400000,0x10001008,0x00000000,0x00001000,0x00400008,0x00000000,0x10400008,0x10401000,0x00001000,0x10000000,0x10401008,0x00401008,0x00400000,0x10401008,0x00000008,0x10001000,0x00401008,0x00400008,0x00401000,0x10400000,0x10001008,0x00001008,0x10000000,0x10000008,0x10401000,],
+[0x08000000,0x00010000,0x00000400,0x08010420,0x08010020,0x08000400,0x00010420,0x08010000,0x00010000,0x00000020,0x08000020,0x00010400,0x08000420,0x08010020,0x08010400,0x00000000,0x00010400,0x08000000,0x00010020,0x00000420,0x08000400,0x00010420,0x00000000,0x08000020,0x00000020,0x08000420,0x08010420,0x00010020,0x08010000,0x00000400,0x00000420,0x08010400,0x08010400,0x08000420,0x00010020,0x08010000,0x00010000,0x00000020,0x08000020,0x08000400,0x08000000,0x00010400,0x08010420,0x00000000,0x00010420,0x08000000,0x00000400,0x00010020,0x08000420,0x00000400,0x00000000,0x08010420,0x08010020,0x08010400,0x00000420,0x00010000,0x00010400,0x08010020,0x08000400,0x00000420,0x00000020,0x00010420,0x08010000,0x08000020,],
+[0x80000040,0x00200040,0x00000000,0x80202000,0x00200040,0x00002000,0x80002040,0x00200000,0x00002040,0x80202040,0x00202000,0x80000000,0x80002000,0x80000040,0x80200000,0x00202040,0x00200000,0x80002040,0x80200040,0x00000000,0x00002000,0x00000040,0x80202000,0x80200040,0x80202040,0x80200000,0x80000000,0x00002040,0x00000040,0x00202000,0x00202040,0x80002000,0x00002040,0x80000000,0x80002000,0x00202040,0x80202000,0x00200040,0x00000000,0x80002000,0x80000000,0x00002000,0x80200040,0x00200000,0x00200040,0x80202040,0x00202000,0x00000040,0x80202040,0x00202000,0x00200000,0x80002040,0x80000040,0x80200000,0x00202040,0x00000000,0x00002000,0x80000040,0x80002040,0x80202000,0x80200000,0x00002040,0x00000040,0x80200040,],
+[0x00004000,0x00000200,0x01000200,0x01000004,0x01004204,0x00004004,0x00004200,0x00000000,0x01000000,0x01000204,0x00000204,0x01004000,0x00000004,0x01004200,0x01004000,0x00000204,0x01000204,0x00004000,0x00004004,0x01004204,0x00000000,0x01000200,0x01000004,0x00004200,0x01004004,0x00004204,0x01004200,0x00000004,0x00004204,0x01004004,0x00000200,0x01000000,0x00004204,0x01004000,0x01004004,0x00000204,0x00004000,0x00000200,0x01000000,0x01004004,0x01000204,0x00004204,0x00004200,0x00000000,0x00000200,0x01000004,0x00000004,0x01000200,0x00000000,0x01000204,0x01000200,0x00004200,0x00000204,0x00004000,0x01004204,0x01000000,0x01004200,0x00000004,0x00004004,0x01004204,0x01000004,0x01004200,0x01004000,0x00004004,],
+[0x20800080,0x20820000,0x00020080,0x00000000,0x20020000,0x00800080,0x20800000,0x20820080,0x00000080,0x20000000,0x00820000,0x00020080,0x00820080,0x20020080,0x20000080,0x20800000,0x00020000,0x00820080,0x00800080,0x20020000,0x20820080,0x20000080,0x00000000,0x00820000,0x20000000,0x00800000,0x20020080,0x20800080,0x00800000,0x00020000,0x20820000,0x00000080,0x00800000,0x00020000,0x20000080,0x20820080,0x00020080,0x20000000,0x00000000,0x00820000,0x20800080,0x20020080,0x20020000,0x00800080,0x20820000,0x00000080,0x00800080,0x20020000,0x20820080,0x00800000,0x20800000,0x20000080,0x00820000,0x00020080,0x20020080,0x20800000,0x00000080,0x20820000,0x00820080,0x00000000,0x20000000,0x20800080,0x00020000,0x00820080,]])
+
+# A block as two little-endian 32-bit DES_LONGs (c2l/l2c byte order)
+_BLOCK = struct.Struct('<2I')
+_block_unpack_from = _BLOCK.unpack_from
+_block_pack_into = _BLOCK.pack_into
+
+# CTR counter blocks: the 8 block bytes as a big-endian 64-bit integer
+_COUNTER = struct.Struct('>Q')
+
+# Fast core. The round function looks up des_SPtrans rows 0/2/4/6 with the
+# bytes of u and rows 1/3/5/7 with the bytes of t, so adjacent pairs of rows
+# are merged into tables indexed by a whole 16-bit half: four lookups per
+# round instead of eight, with no per-row shift and mask.
+#
+# These tables and the IP/FP byte tables below are derived from des_SPtrans
+# and IP/FP and are not built at import: the containers exist from the start
+# (the fast cores bind them as defaults) and _build_tables() fills them in
+# place the first time a DES instance is created.
+
+def _pair_table(a, b):
+    # Entry x is row_a[x >> 2 & 0x3f] ^ row_b[x >> 10 & 0x3f]. Bits 0-1 and
+    # 8-9 of x are not used, so the table is 64 distinct 256-entry rows each
+    # repeated four times, and each row holds 64 distinct values four times.
+    row_a, row_b = des_SPtrans[a], des_SPtrans[b]
+    low = [v for v in row_a for _ in range(4)]
+    table = array('I')
+    for v in row_b:
+        table.extend(array('I', [w ^ v for w in low]) * 4)
+    return table
+
+_SP02 = array('I')
+_SP46 = array('I')
+_SP13 = array('I')
+_SP57 = array('I')
+
+# IP and FP are bit permutations, so each is the OR of its action on the
+# eight input bytes taken separately. The tables below are built once by
+# running the IP/FP PERM_OP sequences on every single-byte input; each entry
+# holds the output pair as (l << 32) | r. The rotates around the rounds are
+# folded in, as is the final swap on the FP side.
+
+def _perm_ops(l, r, ops, r_first):
+    # Applies a PERM_OP sequence the way DES._crypt_longs_traced does, the
+    # operand order alternating from step to step
+    a_is_r = r_first
+    for n, m in ops:
+        if a_is_r:
+            t = ((r >> n) ^ l) & m; r, l = r ^ (t << n), l ^ t
+        else:
+            t = ((l >> n) ^ r) & m; l, r = l ^ (t << n), r ^ t
+        a_is_r = not a_is_r
+    return l, r
+
+def _ip_pair(l, r):
+    # IP leaves L0 in r and R0 in l; the pair comes back as (L0, R0)
+    l, r = _perm_ops(l, r, IP, True)
+    return (r >> 29 | r << 3) & 0xffffffff, (l >> 29 | l << 3) & 0xffffffff
+
+def _fp_pair(l, r):
+    l, r = (r >> 3 | r << 29) & 0xffffffff, (l >> 3 | l << 29) & 0xffffffff
+    l, r = _perm_ops(l, r, FP, False)
+    return r, l
+
+def _byte_tables(pair_fn):
+    # The PERM_OPs and rotates are linear, so only the eight single-bit
+    # inputs of each byte go through pair_fn; every other entry is the OR of
+    # the entry without its lowest set bit and the entry for that bit.
+    tables = []
+    for i in range(8):
+        shift = 8 * (i % 4)
+        bits = []
+        for b in range(8):
+            l, r = pair_fn(1 << (b + shift), 0) if i < 4 else pair_fn(0, 1 << (b + shift))
+            bits.append((l << 32) | r)
+        table = [0] * 256
+        for v in range(1, 256):
+            low_bit = v & -v
+            table[v] = table[v ^ low_bit] | bits[low_bit.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+_IP_TABLES = [[] for _ in range(8)]
+_FP_TABLES = [[] for _ in range(8)]
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+def _build_tables():
+    # Fills the SP and IP/FP tables; later calls return at once
+    global _tables_ready
+    with _tables_lock:
+        if _tables_ready:
+            return
+        for table, (a, b) in ((_SP02, (0, 2)), (_SP46, (4, 6)), (_SP13, (1, 3)), (_SP57, (5, 7))):
+            table.extend(_pair_table(a, b))
+        for tables, pair_fn in ((_IP_TABLES, _ip_pair), (_FP_TABLES, _fp_pair)):
+            for table, built in zip(tables, _byte_tables(pair_fn)):
+                table.extend(built)
+        _tables_ready = True
+
+def _des_crypt_fast(l, r, ks, sp02=_SP02, sp46=_SP46, sp13=_SP13, sp57=_SP57,
+                    ipt=_IP_TABLES, fpt=_FP_TABLES):
+    # Same computation as DES._crypt_longs_traced with the 16 rounds written
+    # out inline and IP/FP done through the byte tables. ks is the 32-entry
+    # schedule in round order (the reversed schedule for decryption).
+    (k0, k1, k2, k3, k4, k5, k6, k7, k8, k9, k10, k11, k12, k13, k14, k15,
+     k16, k17, k18, k19, k20, k21, k22, k23, k24, k25, k26, k27, k28, k29, k30, k31) = ks
+
+    ip0, ip1, ip2, ip3, ip4, ip5, ip6, ip7 = ipt
+
+    # IP and the initial rotate
+    x = (ip0[l & 0xff] | ip1[l >> 8 & 0xff] | ip2[l >> 16 & 0xff] | ip3[l >> 24] |
+         ip4[r & 0xff] | ip5[r >> 8 & 0xff] | ip6[r >> 16 & 0xff] | ip7[r >> 24])
+    l = x >> 32; r = x & 0xffffffff
+
+    # The rounds alternate halves instead of swapping them. t is rotated
+    # without masking; the bits above 31 are dropped by the index masks.
+    u = r ^ k0; t = r ^ k1; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k2; t = l ^ k3; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = r ^ k4; t = r ^ k5; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k6; t = l ^ k7; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = r ^ k8; t = r ^ k9; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k10; t = l ^ k11; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = r ^ k12; t = r ^ k13; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k14; t = l ^ k15; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = r ^ k16; t = r ^ k17; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k18; t = l ^ k19; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = r ^ k20; t = r ^ k21; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k22; t = l ^ k23; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = r ^ k24; t = r ^ k25; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k26; t = l ^ k27; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = r ^ k28; t = r ^ k29; t = t >> 4 | t << 28
+    l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+    u = l ^ k30; t = l ^ k31; t = t >> 4 | t << 28
+    r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+
+    # Final swap, rotate and FP
+    fp0, fp1, fp2, fp3, fp4, fp5, fp6, fp7 = fpt
+    x = (fp0[l & 0xff] | fp1[l >> 8 & 0xff] | fp2[l >> 16 & 0xff] | fp3[l >> 24] |
+         fp4[r & 0xff] | fp5[r >> 8 & 0xff] | fp6[r >> 16 & 0xff] | fp7[r >> 24])
+    return x >> 32, x & 0xffffffff
+
+def _des3_crypt_fast(l, r, kss, sp02=_SP02, sp46=_SP46, sp13=_SP13, sp57=_SP57,
+                     ipt=_IP_TABLES, fpt=_FP_TABLES):
+    # Three DES passes fused as in OpenSSL's des_encrypt3. kss holds the
+    # three round-order schedules, e.g. (enc k1, dec k2, enc k3) for EDE
+    # encryption. FP followed by IP only swaps the halves, so IP and FP run
+    # once per block and the passes are joined by a swap.
+    ip0, ip1, ip2, ip3, ip4, ip5, ip6, ip7 = ipt
+    x = (ip0[l & 0xff] | ip1[l >> 8 & 0xff] | ip2[l >> 16 & 0xff] | ip3[l >> 24] |
+         ip4[r & 0xff] | ip5[r >> 8 & 0xff] | ip6[r >> 16 & 0xff] | ip7[r >> 24])
+    l = x >> 32; r = x & 0xffffffff
+
+    swap = False
+    for ks in kss:
+        if swap:
+            l, r = r, l
+        swap = True
+        for i in range(0, 32, 4):
+            u = r ^ ks[i]; t = r ^ ks[i + 1]; t = t >> 4 | t << 28
+            l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+            u = l ^ ks[i + 2]; t = l ^ ks[i + 3]; t = t >> 4 | t << 28
+            r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16 & 0xffff]
+
+    fp0, fp1, fp2, fp3, fp4, fp5, fp6, fp7 = fpt
+    x = (fp0[l & 0xff] | fp1[l >> 8 & 0xff] | fp2[l >> 16 & 0xff] | fp3[l >> 24] |
+         fp4[r & 0xff] | fp5[r >> 8 & 0xff] | fp6[r >> 16 & 0xff] | fp7[r >> 24])
+    return x >> 32, x & 0xffffffff
+
+def _reverse_schedule(subkeys):
+    # Decryption uses the subkey pairs in reverse order
+    ks = []
+    for i in range(30, -1, -2):
+        ks.append(subkeys[i])
+        ks.append(subkeys[i + 1])
+    return tuple(ks)
+
+# Process-wide key schedule cache. Maps a key string to
+# (key_cblock bytes, encryption schedule, decryption schedule), all immutable,
+# so entries can be shared between DES instances and threads.
+
+class _KeyScheduleCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key_str):
+        with self._lock:
+            entry = self._entries.get(key_str)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key_str)
+            return entry
+
+    def put(self, key_str, entry):
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._entries[key_str] = entry
+            self._entries.move_to_end(key_str)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+_key_cache = _KeyScheduleCache(128)
+
+def set_key_cache_size(maxsize):
+    # Sets how many key schedules are kept; 0 disables the cache
+    _key_cache.resize(maxsize)
+
+def key_cache_info():
+    # Returns a dict with hits, misses, size and maxsize
+    return _key_cache.info()
+
+def clear_key_cache():
+    _key_cache.clear()
+
+# Metrics. Off by default: every instrumented call then costs one global
+# lookup. When enabled, whole-message calls record calls, bytes, blocks,
+# cumulative time and a latency histogram per (cipher class, mode,
+# direction); incremental contexts and readers record the same counters
+# without the histogram, under their own op ('encrypt-update',
+# 'decrypt-update', 'mac-update') so the histogram's sum only ever holds
+# the time of the calls it counts; key setups are counted and timed, key
+# schedule cache hits counted.
+
+# Histogram bucket upper bounds in seconds
+METRICS_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
 
-    def _debug_print_subkeys(self):
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bounds = tuple(int(b * 1e9) for b in METRICS_BUCKETS)
+        # labels -> [calls, bytes, blocks, ns]
+        self.counters = {}
+        # labels -> [count per bucket..., count above the last bucket]
+        self.histograms = {}
+        self.key_setups = 0
+        self.key_setup_ns = 0
+        self.key_cache_hits = 0
+
+    def count(self, labels, nbytes, ns=0):
+        with self._lock:
+            counter = self.counters.get(labels)
+            if counter is None:
+                counter = self.counters[labels] = [0, 0, 0, 0]
+            counter[0] += 1
+            counter[1] += nbytes
+            counter[2] += (nbytes + 7) // 8
+            counter[3] += ns
+
+    def observe(self, labels, nbytes, ns):
+        self.count(labels, nbytes, ns)
+        with self._lock:
+            histogram = self.histograms.get(labels)
+            if histogram is None:
+                histogram = self.histograms[labels] = [0] * (len(self._bounds) + 1)
+            for i, bound in enumerate(self._bounds):
+                if ns <= bound:
+                    break
+            else:
+                i = len(self._bounds)
+            histogram[i] += 1
+
+    def key_setup(self, ns):
+        with self._lock:
+            self.key_setups += 1
+            self.key_setup_ns += ns
+
+    def key_cache_hit(self):
+        with self._lock:
+            self.key_cache_hits += 1
+
+    def snapshot(self):
+        with self._lock:
+            operations = []
+            for labels, (calls, nbytes, blocks, ns) in sorted(self.counters.items()):
+                operation = {'cipher': labels[0], 'mode': labels[1], 'op': labels[2],
+                             'calls': calls, 'bytes': nbytes, 'blocks': blocks, 'seconds': ns / 1e9}
+                histogram = self.histograms.get(labels)
+                if histogram is not None:
+                    cumulative = 0
+                    buckets = {}
+                    for bound, n in zip(METRICS_BUCKETS + (float('inf'),), histogram):
+                        cumulative += n
+                        buckets[str(bound)] = cumulative
+                    operation['latency'] = {'buckets': buckets, 'count': cumulative}
+                operations.append(operation)
+            return {'operations': operations, 'key_setups': self.key_setups,
+                    'key_setup_seconds': self.key_setup_ns / 1e9,
+                    'key_cache_hits': self.key_cache_hits}
+
+_metrics = None
+
+def enable_metrics():
+    # Starts recording; counters already recorded are kept
+    global _metrics
+    if _metrics is None:
+        _metrics = _Metrics()
+
+def disable_metrics():
+    global _metrics
+    _metrics = None
+
+def reset_metrics():
+    global _metrics
+    if _metrics is not None:
+        _metrics = _Metrics()
+
+def metrics_enabled():
+    return _metrics is not None
+
+def metrics_snapshot():
+    # Returns a dict with 'operations' (one entry per cipher/mode/op with
+    # calls, bytes, blocks, seconds and, for whole-message calls, cumulative
+    # latency buckets), key setup counts and time, and key cache hits; None
+    # when metrics are off
+    metrics = _metrics
+    return None if metrics is None else metrics.snapshot()
+
+def metrics_prometheus(prefix='des'):
+    # The snapshot in Prometheus text exposition format
+    snapshot = metrics_snapshot()
+    if snapshot is None:
+        return ''
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+    def labels(operation, extra=''):
+        return (f'{{cipher="{operation["cipher"]}",mode="{operation["mode"]}",'
+                f'op="{operation["op"]}"{extra}}}')
+
+    operations = snapshot['operations']
+    for field, name, help_text in (('calls', 'calls_total', 'Calls into the cipher.'),
+                                   ('bytes', 'bytes_total', 'Bytes processed.'),
+                                   ('blocks', 'blocks_total', 'Blocks processed.'),
+                                   ('seconds', 'seconds_total', 'Time spent processing.')):
+        family(name, 'counter', help_text)
+        for operation in operations:
+            lines.append(f"{prefix}_{name}{labels(operation)} {operation[field]}")
+    family('call_duration_seconds', 'histogram', 'Latency of whole-message calls.')
+    for operation in operations:
+        latency = operation.get('latency')
+        if latency is None:
+            continue
+        for bound, count in latency['buckets'].items():
+            le = '+Inf' if bound == 'inf' else bound
+            extra = f',le="{le}"'
+            lines.append(f"{prefix}_call_duration_seconds_bucket{labels(operation, extra)} {count}")
+        lines.append(f"{prefix}_call_duration_seconds_sum{labels(operation)} {operation['seconds']}")
+        lines.append(f"{prefix}_call_duration_seconds_count{labels(operation)} {latency['count']}")
+    family('key_setups_total', 'counter', 'Key schedules computed.')
+    lines.append(f"{prefix}_key_setups_total {snapshot['key_setups']}")
+    family('key_setup_seconds_total', 'counter', 'Time spent computing key schedules.')
+    lines.append(f"{prefix}_key_setup_seconds_total {snapshot['key_setup_seconds']}")
+    family('key_cache_hits_total', 'counter', 'Key schedules served from the cache.')
+    lines.append(f"{prefix}_key_cache_hits_total {snapshot['key_cache_hits']}")
+    return "\n".join(lines) + "\n"
+
+def _timed(mode, op):
+    # Records a whole-message method taking the message as its first argument
+    def decorate(method):
+        @wraps(method)
+        def timed(self, data, *args, **kwargs):
+            metrics = _metrics
+            if metrics is None:
+                return method(self, data, *args, **kwargs)
+            start = perf_counter_ns()
+            result = method(self, data, *args, **kwargs)
+            metrics.observe((type(self).__name__, mode, op), len(data), perf_counter_ns() - start)
+            return result
+        return timed
+    return decorate
+
+# Tracing. A tracer receives the subkeys, and for every block its input, the
+# L/R/u/t/f values of each round and its output. Whether an instance traces
+# is decided once in the constructor: untraced instances run the fast core
+# and never look at the tracer again.
+
+class DESTracer:
+    # Base class with no-op hooks; override the ones you need. Round values
+    # are reported the way the original debug output computed them: L and R
+    # after the round, u and t as the new R XORed with the round's two
+    # subkeys, and the F-function result.
+
+    def on_subkeys(self, subkeys):
+        pass
+
+    def on_block_in(self, l, r):
+        pass
+
+    def on_round(self, n, l, r, u, t, f):
+        pass
+
+    def on_block_out(self, l, r):
+        pass
+
+
+class PrintTracer(DESTracer):
+    # Prints in the format of python_debug_output.txt; what debug_mode uses
+
+    def on_subkeys(self, subkeys):
         print("Generated Subkeys (Python):")
-        for i in range(0, len(self.subkeys), 2):
-            print(f"  Subkey {i//2 + 1}: L={hex(self.subkeys[i])}, R={hex(self.subkeys[i+1])}")
+        for i in range(0, len(subkeys), 2):
+            print(f"  Subkey {i//2 + 1}: L={hex(subkeys[i])}, R={hex(subkeys[i+1])}")
+
+    def on_round(self, n, l, r, u, t, f):
+        print(f"PYTHON_DEBUG: Round {n}, L={hex(l)}, R={hex(r)}, u_val={hex(u)}, t_val={hex(t)}, f_result={hex(f)}")
+
+
+class RingBufferTracer(DESTracer):
+    # Keeps the last capacity trace records in a preallocated binary ring
+    # buffer, so long runs can be traced without printing or growing memory.
+    # A record is kind, round number and five 32-bit values (L, R, u, t, f;
+    # block records only fill L and R), little-endian.
+
+    RECORD = struct.Struct('<BB2x5I')
+    BLOCK_IN, ROUND, BLOCK_OUT = 1, 2, 3
+
+    def __init__(self, capacity=4096):
+        if capacity <= 0:
+            raise ValueError("Capacity must be a positive number of records.")
+        self.capacity = capacity
+        self.subkeys = []
+        self._buffer = bytearray(capacity * self.RECORD.size)
+        self._next = 0
+        self._count = 0
+
+    def _record(self, kind, n, l=0, r=0, u=0, t=0, f=0):
+        self.RECORD.pack_into(self._buffer, self._next * self.RECORD.size, kind, n, l, r, u, t, f)
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def on_subkeys(self, subkeys):
+        self.subkeys.append(tuple(subkeys))
+
+    def on_block_in(self, l, r):
+        self._record(self.BLOCK_IN, 0, l, r)
+
+    def on_round(self, n, l, r, u, t, f):
+        self._record(self.ROUND, n, l, r, u, t, f)
+
+    def on_block_out(self, l, r):
+        self._record(self.BLOCK_OUT, 0, l, r)
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+    def dump(self):
+        # The retained records, oldest first, as one bytes object
+        size = self.RECORD.size
+        start = (self._next - self._count) % self.capacity
+        if start + self._count <= self.capacity:
+            return bytes(self._buffer[start * size:(start + self._count) * size])
+        return bytes(self._buffer[start * size:]) + bytes(self._buffer[:self._next * size])
+
+    def records(self):
+        # The retained records, oldest first, as tuples
+        return [record for record in self.RECORD.iter_unpack(self.dump())]
+
+    def lines(self, prefix="PYTHON_DEBUG"):
+        # Round records as text in the debug_mode format. Pass the C
+        # implementation's prefix to diff the two traces line by line.
+        return [f"{prefix}: Round {n}, L={hex(l)}, R={hex(r)}, u_val={hex(u)}, t_val={hex(t)}, f_result={hex(f)}"
+                for kind, n, l, r, u, t, f in self.records() if kind == self.ROUND]
+
+
+class DES:
+    def __init__(self, key_str, debug_mode=False, tracer=None):
+        if not _tables_ready:
+            _build_tables()
+        metrics = _metrics
+        entry = _key_cache.get(key_str)
+        if entry is None:
+            start = perf_counter_ns() if metrics is not None else 0
+            # Convert key string to 8-byte des_cblock (bytearray) using C's des_string_to_key logic
+            self.key_cblock = self._des_string_to_key(key_str)
+            subkeys = self._generate_subkeys()
+            # Schedules in round order for the fast core
+            entry = (bytes(self.key_cblock), tuple(subkeys), _reverse_schedule(subkeys))
+            _key_cache.put(key_str, entry)
+            if metrics is not None:
+                metrics.key_setup(perf_counter_ns() - start)
+        else:
+            self.key_cblock = bytearray(entry[0])
+            if metrics is not None:
+                metrics.key_cache_hit()
+        self._enc_ks, self._dec_ks = entry[1], entry[2]
+        self.subkeys = list(self._enc_ks)
+        self._set_tracer(debug_mode, tracer)
+
+    def _set_tracer(self, debug_mode, tracer):
+        # debug_mode without a tracer prints, as it always has
+        self.debug_mode = debug_mode
+        if tracer is None and debug_mode:
+            tracer = PrintTracer()
+        self.tracer = tracer
+        if tracer is None:
+            self._crypt_impl = _des_crypt_fast
+        else:
+            self._crypt_impl = self._crypt_longs_traced
+            tracer.on_subkeys(self.subkeys)
 
     def _des_set_odd_parity(self, key_cblock):
         # Mimics C's des_set_odd_parity
@@ -158,22 +705,30 @@ class DES:
         return key_cblock
 
     def _des_string_to_key(self, s):
-        # Mimics C's des_string_to_key (MIT COMPATIBLE part)
+        # Mimics C's des_string_to_key: the MIT compatible folding, then a
+        # des_cbc_cksum of the string under that key with the key as IV
         key = bytearray(8)
         length = len(s)
 
         for i in range(length):
             j = ord(s[i])
             if (i % 16) < 8:
-                key[i % 8] ^= (j << 1)
+                key[i % 8] ^= (j << 1) & 0xff
             else:
                 # Reverse the bit order
                 j = ((j << 4) & 0xF0) | ((j >> 4) & 0x0F)
                 j = ((j << 2) & 0xCC) | ((j >> 2) & 0x33)
                 j = ((j << 1) & 0xAA) | ((j >> 1) & 0x55)
                 key[7 - (i % 8)] ^= j
-        
-        return self._des_set_odd_parity(key)
+
+        self.key_cblock = self._des_set_odd_parity(key)
+        state = _BLOCK.unpack(bytes(self.key_cblock))
+        if length:
+            data = s.encode('latin-1')
+            data += bytes(-length % 8)
+            ks = tuple(self._generate_subkeys())
+            state = _cbc_mac_run(_des_crypt_fast, ks, data, len(data), state)
+        return self._des_set_odd_parity(bytearray(_BLOCK.pack(*state)))
 
     def _string_to_longs(self, s):
         # Converts an 8-byte string into two 32-bit DES_LONGs (little-endian)
@@ -221,12 +776,12 @@ class DES:
         c, d = self._string_to_longs(self.key_cblock.decode('latin-1'))
 
         # PC1 permutation (from set_key.c)
-        c, d = self._perm_op(d, c, 4, 0x0f0f0f0f)
+        d, c = self._perm_op(d, c, 4, 0x0f0f0f0f)
         c = self._hperm_op(c, -2, 0xcccc0000)
         d = self._hperm_op(d, -2, 0xcccc0000)
-        c, d = self._perm_op(d, c, 1, 0x55555555)
-        d, c = self._perm_op(c, d, 8, 0x00ff00ff)
-        c, d = self._perm_op(d, c, 1, 0x55555555)
+        d, c = self._perm_op(d, c, 1, 0x55555555)
+        c, d = self._perm_op(c, d, 8, 0x00ff00ff)
+        d, c = self._perm_op(d, c, 1, 0x55555555)
 
         d = (((d & 0x000000ff) << 16) | (d & 0x0000ff00) |
              ((d & 0x00ff0000) >> 16) | ((c & 0xf0000000) >> 4))
@@ -274,52 +829,57 @@ class DES:
         t = self._rotate(t, 4)
 
         result = (
-            des_skb[0][(u >> 2) & 0x3f] ^
-            des_skb[2][(u >> 10) & 0x3f] ^
-            des_skb[4][(u >> 18) & 0x3f] ^
-            des_skb[6][(u >> 26) & 0x3f] ^
-            des_skb[1][(t >> 2) & 0x3f] ^
-            des_skb[3][(t >> 10) & 0x3f] ^
-            des_skb[5][(t >> 18) & 0x3f] ^
-            des_skb[7][(t >> 26) & 0x3f]
+            des_SPtrans[0][(u >> 2) & 0x3f] ^
+            des_SPtrans[2][(u >> 10) & 0x3f] ^
+            des_SPtrans[4][(u >> 18) & 0x3f] ^
+            des_SPtrans[6][(u >> 26) & 0x3f] ^
+            des_SPtrans[1][(t >> 2) & 0x3f] ^
+            des_SPtrans[3][(t >> 10) & 0x3f] ^
+            des_SPtrans[5][(t >> 18) & 0x3f] ^
+            des_SPtrans[7][(t >> 26) & 0x3f]
         )
         return result
 
-    def _crypt(self, block_str, decrypt=False):
-        l, r = self._string_to_longs(block_str)
+    def _core(self, decrypt=False):
+        # Returns (crypt, ks) for the mode loops: crypt(l, r, ks) -> (l, r).
+        # crypt is the fast core, or the traced reference path when a tracer
+        # was given.
+        return self._crypt_impl, self._dec_ks if decrypt else self._enc_ks
+
+    def _crypt_longs(self, l, r, decrypt=False):
+        # Runs one block held as two 32-bit DES_LONGs through IP, the 16
+        # rounds and FP, returning the two output DES_LONGs.
+        crypt, ks = self._core(decrypt)
+        return crypt(l, r, ks)
+
+    def _crypt_longs_traced(self, l, r, ks):
+        # Reference implementation of the block function, one macro at a
+        # time, reporting to the tracer. ks is the schedule in round order.
+        tracer = self.tracer
+        tracer.on_block_in(l, r)
 
         # Initial Permutation (IP) - Directly translated from C's IP macro
         # PERM_OP(r,l,tt, 4,0x0f0f0f0fL);
-        l, r = self._perm_op(r, l, 4, 0x0f0f0f0f)
+        r, l = self._perm_op(r, l, 4, 0x0f0f0f0f)
         # PERM_OP(l,r,tt,16,0x0000ffffL);
-        r, l = self._perm_op(l, r, 16, 0x0000ffff)
+        l, r = self._perm_op(l, r, 16, 0x0000ffff)
         # PERM_OP(r,l,tt, 2,0x33333333L);
-        l, r = self._perm_op(r, l, 2, 0x33333333)
+        r, l = self._perm_op(r, l, 2, 0x33333333)
         # PERM_OP(l,r,tt, 8,0x00ff00ffL);
-        r, l = self._perm_op(l, r, 8, 0x00ff00ff)
+        l, r = self._perm_op(l, r, 8, 0x00ff00ff)
         # PERM_OP(r,l,tt, 1,0x55555555L);
-        l, r = self._perm_op(r, l, 1, 0x55555555)
+        r, l = self._perm_op(r, l, 1, 0x55555555)
 
-        # Initial rotate as per C code in des_enc.c
-        l = self._rotate(l, 29)
-        r = self._rotate(r, 29)
+        # Initial rotate as per C code in des_enc.c. IP leaves L0 in r and
+        # R0 in l (C loads the first word into r), so the halves are
+        # renamed here.
+        l, r = self._rotate(r, 29), self._rotate(l, 29)
 
-        # Main DES rounds
-        if decrypt:
-            # Decryption rounds (reverse order of subkeys and operations)
-            for i in range(30, -1, -2):
-                f_result = self._des_f_function(r, self.subkeys[i], self.subkeys[i+1])
-                l, r = r, l ^ f_result
-                if self.debug_mode:
-                    print(f"PYTHON_DEBUG: Round {16 - (i//2)}, L={hex(l)}, R={hex(r)}, u_val={hex(r ^ self.subkeys[i])}, t_val={hex(r ^ self.subkeys[i+1])}, f_result={hex(f_result)}")
-
-        else:
-            # Encryption rounds
-            for i in range(0, 32, 2):
-                f_result = self._des_f_function(r, self.subkeys[i], self.subkeys[i+1])
-                l, r = r, l ^ f_result
-                if self.debug_mode:
-                    print(f"PYTHON_DEBUG: Round {i//2 + 1}, L={hex(l)}, R={hex(r)}, u_val={hex(r ^ self.subkeys[i])}, t_val={hex(r ^ self.subkeys[i+1])}, f_result={hex(f_result)}")
+        # Main DES rounds (ks is already reversed for decryption)
+        for i in range(0, 32, 2):
+            f_result = self._des_f_function(r, ks[i], ks[i+1])
+            l, r = r, l ^ f_result
+            tracer.on_round(i//2 + 1, l, r, r ^ ks[i], r ^ ks[i+1], f_result)
 
         # Final swap after all rounds (this is part of the DES algorithm)
         l, r = r, l
@@ -330,194 +890,1459 @@ class DES:
 
         # Final Permutation (FP) - Directly translated from C's FP macro
         # PERM_OP(l,r,tt, 1,0x55555555L);
-        r, l = self._perm_op(l, r, 1, 0x55555555)
+        l, r = self._perm_op(l, r, 1, 0x55555555)
         # PERM_OP(r,l,tt, 8,0x00ff00ffL);
-        l, r = self._perm_op(r, l, 8, 0x00ff00ff)
+        r, l = self._perm_op(r, l, 8, 0x00ff00ff)
         # PERM_OP(l,r,tt, 2,0x33333333L);
-        r, l = self._perm_op(l, r, 2, 0x33333333)
-        # PERM_OP(l,r,tt,16,0x0000ffffL);
-        l, r = self._perm_op(r, l, 16, 0x0000ffff)
+        l, r = self._perm_op(l, r, 2, 0x33333333)
+        # PERM_OP(r,l,tt,16,0x0000ffffL);
+        r, l = self._perm_op(r, l, 16, 0x0000ffff)
         # PERM_OP(l,r,tt, 4,0x0f0f0f0fL);
-        r, l = self._perm_op(l, r, 4, 0x0f0f0f0f)
+        l, r = self._perm_op(l, r, 4, 0x0f0f0f0f)
 
+        # C stores the macro's r as the first output word
+        l, r = r, l
+        tracer.on_block_out(l, r)
+        return l, r
+
+    def _crypt(self, block_str, decrypt=False):
+        # String-in/string-out wrapper around _crypt_longs, kept for callers
+        # that still work with latin-1 strings
+        l, r = self._string_to_longs(block_str)
+        l, r = self._crypt_longs(l, r, decrypt)
         return self._longs_to_string(l, r)
 
+    # Bytes-native block API. src and dst are any buffers (bytes, bytearray,
+    # memoryview, mmap); blocks are read and written in place with the c2l/l2c
+    # little-endian layout, so no per-block objects are allocated.
+
+    def encrypt_block_into(self, src, dst, offset=0):
+        l, r = _block_unpack_from(src, offset)
+        _block_pack_into(dst, offset, *self._crypt_longs(l, r))
+
+    def decrypt_block_into(self, src, dst, offset=0):
+        l, r = _block_unpack_from(src, offset)
+        _block_pack_into(dst, offset, *self._crypt_longs(l, r, True))
+
+    @_timed('raw', 'encrypt')
+    def encrypt(self, data):
+        # Raw ECB over a whole block-aligned buffer, no padding
+        return self._ecb_blocks(data, False)
+
+    @_timed('raw', 'decrypt')
+    def decrypt(self, data):
+        # Raw ECB over a whole block-aligned buffer, no padding removed
+        return self._ecb_blocks(data, True)
+
+    def _ecb_blocks(self, data, decrypt):
+        src = memoryview(data).cast('B')
+        _check_aligned(src)
+        out = bytearray(len(src))
+        crypt, ks = self._core(decrypt)
+        run = self._vectorized(_ecb_run, len(src)) or _ecb_run
+        run(crypt, ks, src, out, len(src))
+        return bytes(out)
+
+    # Mode methods. Each accepts either a latin-1 str (the original API) or a
+    # bytes-like object, and returns the same kind it was given.
+
+    @_timed('ecb', 'encrypt')
     def encrypt_ecb(self, plaintext):
+        data, as_str = _to_bytes(plaintext)
         # Pad plaintext to be a multiple of 8 bytes
-        padding_len = 8 - (len(plaintext) % 8)
-        padding = chr(padding_len) * padding_len
-        plaintext += padding
-
-        ciphertext = ""
-        for i in range(0, len(plaintext), 8):
-            block = plaintext[i:i+8]
-            ciphertext += self._crypt(block)
-        return ciphertext
+        return _from_bytes(self._ecb_blocks(_pad(data), False), as_str)
 
+    @_timed('ecb', 'decrypt')
     def decrypt_ecb(self, ciphertext):
-        plaintext = ""
-        for i in range(0, len(ciphertext), 8):
-            block = ciphertext[i:i+8]
-            plaintext += self._crypt(block, decrypt=True)
-
-        # Remove padding
-        padding_len = ord(plaintext[-1])
-        return plaintext[:-padding_len]
+        data, as_str = _to_bytes(ciphertext)
+        return _from_bytes(_strip_padding(self._ecb_blocks(data, True)), as_str)
 
+    @_timed('cbc', 'encrypt')
     def encrypt_cbc(self, plaintext, iv):
-        ciphertext = ""
-        prev_block = iv
-        for i in range(0, len(plaintext), 8):
-            block = plaintext[i:i+8]
-            
-            # Convert block and prev_block to longs for XORing
-            block_l, block_r = self._string_to_longs(block)
-            prev_block_l, prev_block_r = self._string_to_longs(prev_block)
-
-            xored_l = block_l ^ prev_block_l
-            xored_r = block_r ^ prev_block_r
-            
-            xored_block_str = self._longs_to_string(xored_l, xored_r)
-            
-            encrypted_block = self._crypt(xored_block_str)
-            ciphertext += encrypted_block
-            prev_block = encrypted_block
-        return ciphertext
+        return self._run_mode(_cbc_encrypt_run, plaintext, iv, False, aligned=True)
 
+    @_timed('cbc', 'decrypt')
     def decrypt_cbc(self, ciphertext, iv):
-        plaintext = ""
-        prev_block = iv
-        for i in range(0, len(ciphertext), 8):
-            block = ciphertext[i:i+8]
-            decrypted_block_str = self._crypt(block, decrypt=True)
-            
-            # Convert decrypted_block_str and prev_block to longs for XORing
-            decrypted_l, decrypted_r = self._string_to_longs(decrypted_block_str)
-            prev_block_l, prev_block_r = self._string_to_longs(prev_block)
-
-            xored_l = decrypted_l ^ prev_block_l
-            xored_r = decrypted_r ^ prev_block_r
-            
-            plaintext_block = self._longs_to_string(xored_l, xored_r)
-            
-            plaintext += plaintext_block
-            prev_block = block
-        
         # Remove padding
-        padding_len = ord(plaintext[-1])
-        return plaintext[:-padding_len]
+        return self._run_mode(_cbc_decrypt_run, ciphertext, iv, True, aligned=True, unpad=True)
 
+    @_timed('cfb', 'encrypt')
     def encrypt_cfb(self, plaintext, iv):
-        ciphertext = ""
-        prev_block = iv
-        for i in range(0, len(plaintext), 8):
-            block = plaintext[i:i+8]
-            encrypted_block = self._crypt(prev_block)
-            
-            block_l, block_r = self._string_to_longs(block)
-            encrypted_l, encrypted_r = self._string_to_longs(encrypted_block)
-            
-            xored_l = block_l ^ encrypted_l
-            xored_r = block_r ^ encrypted_r
-            
-            xored_block_str = self._longs_to_string(xored_l, xored_r)
-            
-            ciphertext += xored_block_str
-            prev_block = xored_block_str
-        return ciphertext
+        return self._run_mode(_cfb_encrypt_run, plaintext, iv, False)
 
+    @_timed('cfb', 'decrypt')
     def decrypt_cfb(self, ciphertext, iv):
-        plaintext = ""
-        prev_block = iv
-        for i in range(0, len(ciphertext), 8):
-            block = ciphertext[i:i+8]
-            encrypted_block = self._crypt(prev_block)
-            
-            block_l, block_r = self._string_to_longs(block)
-            encrypted_l, encrypted_r = self._string_to_longs(encrypted_block)
-            
-            xored_l = block_l ^ encrypted_l
-            xored_r = block_r ^ encrypted_r
-            
-            plaintext_block = self._longs_to_string(xored_l, xored_r)
-            
-            plaintext += plaintext_block
-            prev_block = block
-        return plaintext
+        return self._run_mode(_cfb_decrypt_run, ciphertext, iv, False)
 
+    @_timed('ofb', 'encrypt')
     def encrypt_ofb(self, plaintext, iv):
-        ciphertext = ""
-        prev_block = iv
-        for i in range(0, len(plaintext), 8):
-            block = plaintext[i:i+8]
-            encrypted_block = self._crypt(prev_block)
-            
-            block_l, block_r = self._string_to_longs(block)
-            encrypted_l, encrypted_r = self._string_to_longs(encrypted_block)
-            
-            xored_l = block_l ^ encrypted_l
-            xored_r = block_r ^ encrypted_r
-            
-            xored_block_str = self._longs_to_string(xored_l, xored_r)
-            
-            ciphertext += xored_block_str
-            prev_block = encrypted_block
-        return ciphertext
+        return self._run_mode(_ofb_run, plaintext, iv, False)
 
+    @_timed('ofb', 'decrypt')
     def decrypt_ofb(self, ciphertext, iv):
-        return self.encrypt_ofb(ciphertext, iv)  # OFB decryption is the same as encryption
+        return self._run_mode(_ofb_run, ciphertext, iv, False)  # OFB decryption is the same as encryption
 
+    @_timed('pcbc', 'encrypt')
     def encrypt_pcbc(self, plaintext, iv):
         # Pad plaintext to be a multiple of 8 bytes
-        padding_len = 8 - (len(plaintext) % 8)
-        padding = chr(padding_len) * padding_len
-        plaintext += padding
-
-        ciphertext = ""
-        current_iv = iv
-        for i in range(0, len(plaintext), 8):
-            block = plaintext[i:i+8]
-            
-            block_l, block_r = self._string_to_longs(block)
-            current_iv_l, current_iv_r = self._string_to_longs(current_iv)
-            
-            xored_block_l = block_l ^ current_iv_l
-            xored_block_r = block_r ^ current_iv_r
-            
-            xored_block_str = self._longs_to_string(xored_block_l, xored_block_r)
-            
-            encrypted_block = self._crypt(xored_block_str)
-            ciphertext += encrypted_block
-            
-            encrypted_l, encrypted_r = self._string_to_longs(encrypted_block)
-            
-            current_iv_l = block_l ^ encrypted_l
-            current_iv_r = block_r ^ encrypted_r
-            current_iv = self._longs_to_string(current_iv_l, current_iv_r)
-        return ciphertext
+        return self._run_mode(_pcbc_encrypt_run, plaintext, iv, False, pad=True)
 
+    @_timed('pcbc', 'decrypt')
     def decrypt_pcbc(self, ciphertext, iv):
-        plaintext = ""
-        current_iv = iv
-        for i in range(0, len(ciphertext), 8):
-            block = ciphertext[i:i+8]
-            decrypted_block_str = self._crypt(block, decrypt=True)
-            
-            decrypted_l, decrypted_r = self._string_to_longs(decrypted_block_str)
-            current_iv_l, current_iv_r = self._string_to_longs(current_iv)
-            
-            plaintext_block_l = decrypted_l ^ current_iv_l
-            plaintext_block_r = decrypted_r ^ current_iv_r
-            
-            plaintext_block = self._longs_to_string(plaintext_block_l, plaintext_block_r)
-            plaintext += plaintext_block
-            
-            block_l, block_r = self._string_to_longs(block)
-            
-            current_iv_l = plaintext_block_l ^ block_l
-            current_iv_r = plaintext_block_r ^ block_r
-            current_iv = self._longs_to_string(current_iv_l, current_iv_r)
-
         # Remove padding
-        padding_len = ord(plaintext[-1])
-        return plaintext[:-padding_len]
+        return self._run_mode(_pcbc_decrypt_run, ciphertext, iv, True, aligned=True, unpad=True)
+
+    def _run_mode(self, run, text, iv, decrypt, aligned=False, pad=False, unpad=False):
+        # Runs a chained mode over a whole message. A trailing partial block
+        # (CFB/OFB only) is XORed with the leading bytes of the next
+        # keystream block.
+        data, as_str = _to_bytes(text)
+        if pad:
+            data = _pad(data)
+        elif aligned:
+            _check_aligned(data)
+        length = len(data)
+        full = length - length % 8
+        out = bytearray(length)
+        crypt, ks = self._core(decrypt)
+        run = self._vectorized(run, full) or run
+        state = run(crypt, ks, data, out, full, _iv_longs(iv))
+        if full < length:
+            _xor_tail_into(out, data, full, crypt(*state, ks))
+        if unpad:
+            out = _strip_padding(out)
+        return _from_bytes(out, as_str)
+
+    @_timed('ctr', 'encrypt')
+    def encrypt_ctr(self, plaintext, iv, offset=0):
+        # Counter mode. Keystream block i encrypts the IV, read as a
+        # big-endian 64-bit counter, plus i. offset is the byte position of
+        # the data in the stream, so any range can be processed on its own.
+        return self._ctr(plaintext, iv, offset)
+
+    @_timed('ctr', 'decrypt')
+    def decrypt_ctr(self, ciphertext, iv, offset=0):
+        return self._ctr(ciphertext, iv, offset)  # CTR decryption is the same as encryption
+
+    def _ctr(self, text, iv, offset):
+        data, as_str = _to_bytes(text)
+        out = bytearray(len(data))
+        CTRContext(self, iv, offset)._transform(data, out)
+        return _from_bytes(out, as_str)
+
+    def _vectorized(self, run, n):
+        # Returns the NumPy version of a block loop when it has one, NumPy is
+        # installed and n bytes are worth it; None otherwise. Traced
+        # instances always run the scalar path so every round is reported.
+        if n < NUMPY_MIN_BYTES or self.tracer is not None:
+            return None
+        np_run = _NUMPY_RUNS.get(run)
+        if np_run is None or not _numpy_tables():
+            return None
+        return _np_windowed(np_run) if n > NUMPY_WINDOW else np_run
+
+    # Files through mmap. The output is the same size as the input apart
+    # from the padding block, so a file is transformed window by window
+    # straight between mappings (or within one, in place) and the page cache
+    # does the I/O; no buffer proportional to the file size is allocated.
+
+    def encrypt_file(self, path, mode='ecb', iv=None, out_path=None, window=None):
+        # Encrypts path into out_path, or in place when out_path is None.
+        # Modes and padding match the whole-message methods, 'ctr' included.
+        # Returns the output size in bytes.
+        return _mmap_transform(self, mode, False, path, out_path, iv, window)
+
+    def decrypt_file(self, path, mode='ecb', iv=None, out_path=None, window=None):
+        return _mmap_transform(self, mode, True, path, out_path, iv, window)
+
+    # asyncio streams. source is an asyncio.StreamReader (or anything with
+    # an async read(n)) or an async iterator of bytes-like chunks; the result
+    # is an async generator of output chunks. Chunks of inline_bytes or more
+    # are processed on executor (the loop's default when None) so the event
+    # loop keeps running. The next chunk is only read once the consumer asks
+    # for more output, so a slow consumer slows the source down:
+    #
+    #     async for chunk in des.decrypt_stream_async(reader, 'cbc', iv):
+    #         writer.write(chunk)
+    #         await writer.drain()
+
+    def encrypt_stream_async(self, source, mode, iv=None, executor=None,
+                             chunk_size=None, inline_bytes=None):
+        return _stream_async(self.encryptor(mode, iv), source, executor, chunk_size, inline_bytes)
+
+    def decrypt_stream_async(self, source, mode, iv=None, executor=None,
+                             chunk_size=None, inline_bytes=None):
+        return _stream_async(self.decryptor(mode, iv), source, executor, chunk_size, inline_bytes)
+
+    # MACs. CBC-MAC (ANSI X9.9 / ISO 9797-1 algorithm 1) and the ANSI X9.19
+    # retail MAC (algorithm 3), both with zero padding, keeping only the
+    # running chaining value. For block-aligned data cbc_mac(data, iv) is
+    # encrypt_cbc(data, iv)[-8:].
+
+    def mac(self, key2=None, iv=None):
+        # Returns a MACContext; with key2 (a key string or DES) it computes
+        # the retail MAC with this instance as K1 and key2 as K2
+        return MACContext(self, key2, iv)
+
+    @_timed('cbc-mac', 'mac')
+    def cbc_mac(self, data, iv=None):
+        context = MACContext(self, None, iv)
+        context._update(data)
+        return context.digest()
+
+    @_timed('retail-mac', 'mac')
+    def retail_mac(self, data, key2, iv=None):
+        context = MACContext(self, key2, iv)
+        context._update(data)
+        return context.digest()
+
+    # Incremental interface
+
+    def encryptor(self, mode, iv=None):
+        # Returns a CipherContext encrypting in the given mode ('ecb', 'cbc',
+        # 'cfb', 'ofb', 'pcbc' or the des(1) file formats 'des1-cbc' and
+        # 'des1-ecb'), or a CTRContext for 'ctr'
+        if mode == 'ctr':
+            return CTRContext(self, iv)
+        return CipherContext(self, mode, iv)
+
+    def decryptor(self, mode, iv=None):
+        if mode == 'ctr':
+            return CTRContext(self, iv, decrypt=True)
+        return CipherContext(self, mode, iv, decrypt=True)
+
+
+class TripleDES(DES):
+    # Triple DES in EDE form: encryption is E(k3, D(k2, E(k1, block))).
+    # With two keys (EDE2) k3 is k1. The single-key schedules come from DES,
+    # so the key schedule cache applies, and every mode method, context and
+    # backend of DES works unchanged on top of the fused three-pass core.
+
+    def __init__(self, key1, key2, key3=None, debug_mode=False, tracer=None):
+        k1 = DES(key1)
+        k2 = DES(key2)
+        k3 = k1 if key3 is None else DES(key3)
+        self.keys = (k1, k2, k3)
+        self._enc_ks = (k1._enc_ks, k2._dec_ks, k3._enc_ks)
+        self._dec_ks = (k3._dec_ks, k2._enc_ks, k1._dec_ks)
+        self._set_tracer(debug_mode, tracer)
+
+    def _set_tracer(self, debug_mode, tracer):
+        self.debug_mode = debug_mode
+        if tracer is None and debug_mode:
+            tracer = PrintTracer()
+        self.tracer = tracer
+        if tracer is None:
+            self._crypt_impl = _des3_crypt_fast
+        else:
+            self._crypt_impl = self._crypt3_traced
+            for des in self.keys:
+                tracer.on_subkeys(des.subkeys)
+
+    def _crypt3_traced(self, l, r, kss):
+        # Three full single-DES passes, each with its own IP and FP
+        for ks in kss:
+            l, r = self._crypt_longs_traced(l, r, ks)
+        return l, r
+
+
+# Block loops shared by the whole-message methods and CipherContext. Each
+# processes the first n bytes (a multiple of 8) of src into out and takes and
+# returns the chaining state as a pair of DES_LONGs.
+
+def _ecb_run(crypt, ks, src, out, n, state=None):
+    for off in range(0, n, 8):
+        l, r = _block_unpack_from(src, off)
+        _block_pack_into(out, off, *crypt(l, r, ks))
+    return state
+
+def _cbc_encrypt_run(crypt, ks, src, out, n, state):
+    prev_l, prev_r = state
+    for off in range(0, n, 8):
+        l, r = _block_unpack_from(src, off)
+        prev_l, prev_r = crypt(l ^ prev_l, r ^ prev_r, ks)
+        _block_pack_into(out, off, prev_l, prev_r)
+    return prev_l, prev_r
+
+def _cbc_decrypt_run(crypt, ks, src, out, n, state):
+    prev_l, prev_r = state
+    for off in range(0, n, 8):
+        l, r = _block_unpack_from(src, off)
+        dec_l, dec_r = crypt(l, r, ks)
+        _block_pack_into(out, off, dec_l ^ prev_l, dec_r ^ prev_r)
+        prev_l, prev_r = l, r
+    return prev_l, prev_r
+
+def _cfb_encrypt_run(crypt, ks, src, out, n, state):
+    prev_l, prev_r = state
+    for off in range(0, n, 8):
+        s_l, s_r = crypt(prev_l, prev_r, ks)
+        l, r = _block_unpack_from(src, off)
+        prev_l, prev_r = l ^ s_l, r ^ s_r
+        _block_pack_into(out, off, prev_l, prev_r)
+    return prev_l, prev_r
+
+def _cfb_decrypt_run(crypt, ks, src, out, n, state):
+    prev_l, prev_r = state
+    for off in range(0, n, 8):
+        s_l, s_r = crypt(prev_l, prev_r, ks)
+        l, r = _block_unpack_from(src, off)
+        _block_pack_into(out, off, l ^ s_l, r ^ s_r)
+        prev_l, prev_r = l, r
+    return prev_l, prev_r
+
+def _ofb_run(crypt, ks, src, out, n, state):
+    s_l, s_r = state
+    for off in range(0, n, 8):
+        s_l, s_r = crypt(s_l, s_r, ks)
+        l, r = _block_unpack_from(src, off)
+        _block_pack_into(out, off, l ^ s_l, r ^ s_r)
+    return s_l, s_r
+
+def _pcbc_encrypt_run(crypt, ks, src, out, n, state):
+    iv_l, iv_r = state
+    for off in range(0, n, 8):
+        l, r = _block_unpack_from(src, off)
+        enc_l, enc_r = crypt(l ^ iv_l, r ^ iv_r, ks)
+        _block_pack_into(out, off, enc_l, enc_r)
+        iv_l, iv_r = l ^ enc_l, r ^ enc_r
+    return iv_l, iv_r
+
+def _pcbc_decrypt_run(crypt, ks, src, out, n, state):
+    iv_l, iv_r = state
+    for off in range(0, n, 8):
+        l, r = _block_unpack_from(src, off)
+        dec_l, dec_r = crypt(l, r, ks)
+        plain_l, plain_r = dec_l ^ iv_l, dec_r ^ iv_r
+        _block_pack_into(out, off, plain_l, plain_r)
+        iv_l, iv_r = plain_l ^ l, plain_r ^ r
+    return iv_l, iv_r
+
+def _ctr_run(crypt, ks, src, out, n, counter):
+    # The state is the counter for the first block rather than a pair
+    pack_counter = _COUNTER.pack
+    unpack = _BLOCK.unpack
+    for off in range(0, n, 8):
+        s_l, s_r = crypt(*unpack(pack_counter(counter & 0xffffffffffffffff)), ks)
+        l, r = _block_unpack_from(src, off)
+        _block_pack_into(out, off, l ^ s_l, r ^ s_r)
+        counter += 1
+    return counter
+
+def _cbc_mac_run(crypt, ks, src, n, state):
+    # CBC encryption of the first n bytes keeping only the last block
+    l, r = state
+    for off in range(0, n, 8):
+        a, b = _block_unpack_from(src, off)
+        l, r = crypt(l ^ a, r ^ b, ks)
+    return l, r
+
+# mode -> (encrypt run, decrypt run, needs iv, padding, stream)
+# Padded modes pad in encryption and strip in decryption, except CBC which,
+# like encrypt_cbc, expects aligned plaintext and only strips on decryption.
+# The des1 modes read and write the file format of the libdes des(1)
+# program: CBC from a zero IV (or ECB, des -b), with the last block holding
+# random fill and a count of the data bytes in it.
+_MODES = {
+    'ecb': (_ecb_run, _ecb_run, False, 'pkcs5', False),
+    'cbc': (_cbc_encrypt_run, _cbc_decrypt_run, True, None, False),
+    'cfb': (_cfb_encrypt_run, _cfb_decrypt_run, True, None, True),
+    'ofb': (_ofb_run, _ofb_run, True, None, True),
+    'pcbc': (_pcbc_encrypt_run, _pcbc_decrypt_run, True, 'pkcs5', False),
+    'des1-cbc': (_cbc_encrypt_run, _cbc_decrypt_run, True, 'des1', False),
+    'des1-ecb': (_ecb_run, _ecb_run, False, 'des1', False),
+}
+
+def _metric_labels(des, mode, decrypt):
+    return (type(des).__name__, mode, 'decrypt' if decrypt else 'encrypt')
+
+def _update_labels(des, mode, decrypt):
+    # Streaming updates, counted apart from whole-message calls
+    return (type(des).__name__, mode, 'decrypt-update' if decrypt else 'encrypt-update')
+
+def _resolve_mode(des, mode, iv, decrypt):
+    # Returns (crypt, ks, run, state, pad, unpad, stream) for one direction
+    # of a mode in _MODES; pad and unpad are the padding functions, or None
+    try:
+        enc_run, dec_run, needs_iv, padding, stream = _MODES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown mode: {mode!r}") from None
+    if needs_iv and iv is None:
+        if padding != 'des1':
+            raise ValueError(f"Mode {mode!r} requires an IV.")
+        iv = bytes(8)
+    pad, unpad = _PADDINGS.get(padding, (None, None))
+    if mode == 'cbc':
+        unpad = _strip_padding
+    # CFB and OFB only ever run the cipher forwards
+    crypt, ks = des._core(decrypt and not stream)
+    return (crypt, ks, dec_run if decrypt else enc_run, _iv_longs(iv) if needs_iv else None,
+            None if decrypt else pad, unpad if decrypt else None, stream)
+
+
+class CipherContext:
+    # Incremental encryption or decryption in one mode. update() returns the
+    # output for every complete block seen so far and buffers the rest;
+    # finalize() handles the tail, including padding, and ends the context.
+    # Output concatenated over all calls equals the matching whole-message
+    # method of DES.
+
+    def __init__(self, des, mode, iv=None, decrypt=False):
+        self.mode = mode
+        self.decrypt = decrypt
+        (self._crypt, self._ks, self._run, self._state,
+         self._pad, self._unpad, self._stream) = _resolve_mode(des, mode, iv, decrypt)
+        self._labels = _update_labels(des, mode, decrypt)
+        self._des = des
+        self._buffer = bytearray()
+        self._finalized = False
+
+    def update(self, data):
+        metrics = _metrics
+        if metrics is None:
+            return self._update(data)
+        start = perf_counter_ns()
+        out = self._update(data)
+        metrics.count(self._labels, len(data), perf_counter_ns() - start)
+        return out
+
+    def _update(self, data):
+        if self._finalized:
+            raise ValueError("Context already finalized.")
+        buffer = self._buffer
+        buffer += data
+        n = len(buffer) - len(buffer) % 8
+        if self._unpad and n == len(buffer):
+            # Hold back the last block; it may carry padding
+            n -= 8
+        if n <= 0:
+            return b''
+        out = bytearray(n)
+        run = self._des._vectorized(self._run, n) or self._run
+        self._state = run(self._crypt, self._ks, buffer, out, n, self._state)
+        del buffer[:n]
+        return bytes(out)
+
+    def finalize(self):
+        if self._finalized:
+            raise ValueError("Context already finalized.")
+        self._finalized = True
+        data = bytes(self._buffer)
+        self._buffer = bytearray()
+        if self._pad:
+            data = self._pad(data)
+        elif self._stream:
+            out = bytearray(len(data))
+            if data:
+                _xor_tail_into(out, data, 0, self._crypt(*self._state, self._ks))
+            return bytes(out)
+        elif self._unpad:
+            if len(data) != 8:
+                raise ValueError("Data length must be a non-zero multiple of 8 bytes.")
+        elif data:
+            raise ValueError("Data length must be a multiple of 8 bytes.")
+        out = bytearray(len(data))
+        self._state = self._run(self._crypt, self._ks, data, out, len(data), self._state)
+        if self._unpad:
+            out = self._unpad(out)
+        return bytes(out)
+
+
+class MACContext:
+    # Incremental CBC-MAC or retail MAC. update() can be called with any
+    # amount of data and only ever buffers a partial block; digest() can be
+    # called at any point without ending the computation. The message is
+    # zero padded to whole blocks, an empty message to one zero block.
+
+    def __init__(self, des, key2=None, iv=None, _state=None):
+        self._des = des
+        self._crypt, self._ks = des._core()
+        if key2 is not None and not isinstance(key2, DES):
+            key2 = DES(key2)
+        self._key2 = key2
+        self.kind = 'cbc-mac' if key2 is None else 'retail-mac'
+        self._labels = (type(des).__name__, self.kind, 'mac-update')
+        if _state is None:
+            _state = (_iv_longs(iv) if iv is not None else (0, 0), bytearray(), 0)
+        self._state, self._buffer, self._length = _state
+
+    def copy(self):
+        return MACContext(self._des, self._key2, _state=(self._state, bytearray(self._buffer), self._length))
+
+    def update(self, data):
+        metrics = _metrics
+        if metrics is None:
+            return self._update(data)
+        start = perf_counter_ns()
+        self._update(data)
+        metrics.count(self._labels, len(memoryview(_to_bytes(data)[0])), perf_counter_ns() - start)
+
+    def _update(self, data):
+        src = memoryview(_to_bytes(data)[0]).cast('B')
+        self._length += len(src)
+        buffer = self._buffer
+        if buffer:
+            take = 8 - len(buffer)
+            buffer += src[:take]
+            src = src[take:]
+            if len(buffer) < 8:
+                return
+            self._state = _cbc_mac_run(self._crypt, self._ks, buffer, 8, self._state)
+            del buffer[:]
+        n = len(src) - len(src) % 8
+        if n:
+            self._state = _cbc_mac_run(self._crypt, self._ks, src, n, self._state)
+        buffer += src[n:]
+
+    def digest(self):
+        state = self._state
+        if self._buffer or not self._length:
+            last = bytes(self._buffer) + bytes(8 - len(self._buffer))
+            state = _cbc_mac_run(self._crypt, self._ks, last, 8, state)
+        if self._key2 is not None:
+            # X9.19: decrypt the last block under K2, encrypt it again under K1
+            crypt2, ks2 = self._key2._core(True)
+            state = self._crypt(*crypt2(*state, ks2), self._ks)
+        return _BLOCK.pack(*state)
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+    def verify(self, tag):
+        # Constant-time comparison against an expected tag
+        return _compare_digest(self.digest(), _to_bytes(tag)[0])
+
+
+def verify_mac_batch(key_str, pairs, key2=None, iv=None, workers=None):
+    # Checks (message, tag) pairs under one key (two for the retail MAC) and
+    # returns a list of booleans in input order. Every pair is computed and
+    # compared in constant time, so the result does not reveal how far a
+    # wrong tag matched. With workers > 1 the pairs are split into ranges
+    # verified on a process pool.
+    pairs = list(pairs)
+    if not workers or workers < 2 or len(pairs) < 2 * workers:
+        return _verify_macs(DES(key_str), key2, iv, pairs)
+    from concurrent.futures import ProcessPoolExecutor
+    per_range = -(-len(pairs) // (workers * 4))
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_verify_mac_range, key_str, key2, iv, pairs[start:start + per_range])
+                   for start in range(0, len(pairs), per_range)]
+        return [ok for future in futures for ok in future.result()]
+
+def _verify_mac_range(key_str, key2, iv, pairs):
+    return _verify_macs(DES(key_str), key2, iv, pairs)
+
+def _verify_macs(des, key2, iv, pairs):
+    if key2 is not None and not isinstance(key2, DES):
+        key2 = DES(key2)
+    results = []
+    for message, tag in pairs:
+        context = MACContext(des, key2, iv)
+        context._update(message)
+        results.append(_compare_digest(context.digest(), _to_bytes(tag)[0]))
+    return results
+
+def _compare_digest(a, b):
+    # hmac is imported on first use, not with the module: it brings in
+    # hashlib and OpenSSL, about 6 ms, which would nearly double the time
+    # to import des for callers that never verify a MAC
+    import hmac
+    return hmac.compare_digest(a, b)
+
+
+# NumPy backend. The same block loops over all blocks at once: each half of
+# every block sits in a uint32 array, the IP/FP PERM_OP sequences and rotates
+# run as array operations and the merged SP tables are gathered with fancy
+# indexing. Used automatically for ECB, CBC decryption and CTR from
+# NUMPY_MIN_BYTES up, in whole-message calls and in every streaming update;
+# NumPy stays optional and is imported on first use.
+
+# Below this the per-call array overhead outweighs the scalar loop (the two
+# cross at about 256 bytes)
+NUMPY_MIN_BYTES = 1024
+
+# Bytes converted to arrays at a time. The temporaries are several times the
+# window, so this bounds the memory of a call on any message size, and the
+# arrays stay cache sized (64 KiB windows also run faster than 1 MiB ones).
+NUMPY_WINDOW = 64 * 1024
+
+_np_tables = None
+
+def _numpy_tables():
+    # (numpy, sp02, sp46, sp13, sp57), or False when NumPy is not installed
+    global _np_tables
+    if _np_tables is None:
+        if not _tables_ready:
+            _build_tables()
+        try:
+            import numpy
+        except ImportError:
+            _np_tables = False
+        else:
+            _np_tables = (numpy,) + tuple(numpy.array(table, dtype=numpy.uint32)
+                                          for table in (_SP02, _SP46, _SP13, _SP57))
+    return _np_tables
+
+def _np_crypt(l, r, ks):
+    # _des_crypt_fast over uint32 arrays of left and right halves, or
+    # _des3_crypt_fast when ks holds three schedules
+    np, sp02, sp46, sp13, sp57 = _numpy_tables()
+    l, r = _ip_pair(l, r)
+    for n, pass_ks in enumerate(ks if len(ks) == 3 else (ks,)):
+        if n:
+            l, r = r, l
+        for i in range(0, 32, 4):
+            u = r ^ pass_ks[i]; t = r ^ pass_ks[i + 1]; t = (t >> 4) | (t << 28)
+            l ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16]
+            u = l ^ pass_ks[i + 2]; t = l ^ pass_ks[i + 3]; t = (t >> 4) | (t << 28)
+            r ^= sp02[u & 0xffff] ^ sp46[u >> 16] ^ sp13[t & 0xffff] ^ sp57[t >> 16]
+    return _fp_pair(l, r)
+
+def _np_words(buf, n):
+    # The first n bytes of buf as little-endian uint32 words, without copying
+    np = _numpy_tables()[0]
+    return np.frombuffer(buf, dtype='<u4', count=n // 4)
+
+def _np_ecb_run(crypt, ks, src, out, n, state=None):
+    words = _np_words(src, n)
+    dst = _np_words(out, n)
+    dst[0::2], dst[1::2] = _np_crypt(words[0::2], words[1::2], ks)
+    return state
+
+def _np_cbc_decrypt_run(crypt, ks, src, out, n, state):
+    np = _numpy_tables()[0]
+    words = _np_words(src, n)
+    dst = _np_words(out, n)
+    l, r = words[0::2], words[1::2]
+    dec_l, dec_r = _np_crypt(l, r, ks)
+    # Read the next state before writing, src and out may be the same buffer
+    next_state = int(l[-1]), int(r[-1])
+    dst[0::2] = dec_l ^ np.concatenate(([state[0]], l[:-1])).astype(np.uint32)
+    dst[1::2] = dec_r ^ np.concatenate(([state[1]], r[:-1])).astype(np.uint32)
+    return next_state
+
+def _np_ctr_run(crypt, ks, src, out, n, counter):
+    np = _numpy_tables()[0]
+    blocks = n // 8
+    counters = np.arange(blocks, dtype=np.uint64) + np.uint64(counter & 0xffffffffffffffff)
+    # Big-endian counter bytes read back as the two little-endian halves
+    halves = counters.astype('>u8').view('<u4')
+    s_l, s_r = _np_crypt(halves[0::2].astype(np.uint32), halves[1::2].astype(np.uint32), ks)
+    words = _np_words(src, n)
+    dst = _np_words(out, n)
+    dst[0::2] = words[0::2] ^ s_l
+    dst[1::2] = words[1::2] ^ s_r
+    return counter + blocks
+
+def _np_windowed(np_run):
+    # np_run over NUMPY_WINDOW bytes at a time, carrying the state across
+    def run(crypt, ks, src, out, n, state=None):
+        src, out = memoryview(src).cast('B'), memoryview(out).cast('B')
+        try:
+            for start in range(0, n, NUMPY_WINDOW):
+                end = min(start + NUMPY_WINDOW, n)
+                state = np_run(crypt, ks, src[start:end], out[start:end], end - start, state)
+        finally:
+            src.release()
+            out.release()
+        return state
+    return run
+
+_NUMPY_RUNS = {
+    _ecb_run: _np_ecb_run,
+    _cbc_decrypt_run: _np_cbc_decrypt_run,
+    _ctr_run: _np_ctr_run,
+}
+
+
+# Multi-key batches. encrypt_batch/decrypt_batch take (key, iv, data)
+# records, each under its own key, and return the outputs in input order,
+# identical to calling the whole-message method of DES(key) per record. Each
+# distinct key is scheduled once per call (and through the key schedule
+# cache across calls). With NumPy, records of equal length are processed
+# together: every record is a lane, _np_crypt runs with a per-lane schedule,
+# and chained modes step through the blocks once for the whole group.
+
+# Groups with fewer records run through the scalar path
+BATCH_NUMPY_MIN_RECORDS = 16
+
+# mode -> (pads on encryption, strips on decryption, uses the decryption schedule to decrypt)
+_BATCH_MODES = {
+    'ecb': (True, True, True),
+    'cbc': (False, True, True),
+    'cfb': (False, False, False),
+    'ofb': (False, False, False),
+    'pcbc': (True, True, True),
+    'ctr': (False, False, False),
+}
+
+def encrypt_batch(records, mode='cbc'):
+    # records: iterable of (key_str, iv, data); iv is ignored for 'ecb'
+    return _run_batch(records, mode, False)
+
+def decrypt_batch(records, mode='cbc'):
+    return _run_batch(records, mode, True)
+
+def _run_batch(records, mode, decrypt):
+    try:
+        pad, unpad, reverse = _BATCH_MODES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown mode: {mode!r}") from None
+    metrics = _metrics
+    start = perf_counter_ns() if metrics is not None else 0
+    ciphers = {}
+    prepared = []
+    for key_str, iv, text in records:
+        cipher = ciphers.get(key_str)
+        if cipher is None:
+            cipher = ciphers[key_str] = DES(key_str)
+        data, as_str = _to_bytes(text)
+        if pad and not decrypt:
+            data = _pad(data)
+        elif (unpad and decrypt or mode == 'cbc') and len(data) % 8:
+            raise ValueError("Data length must be a multiple of 8 bytes.")
+        prepared.append((cipher, None if mode == 'ecb' else _to_bytes(iv)[0], data, as_str))
+
+    results = [None] * len(prepared)
+    groups = {}
+    for i, (_, _, data, _) in enumerate(prepared):
+        groups.setdefault(len(data), []).append(i)
+    np_ok = len(prepared) >= BATCH_NUMPY_MIN_RECORDS and _numpy_tables()
+    for length, indices in groups.items():
+        if np_ok and length >= 8 and len(indices) >= BATCH_NUMPY_MIN_RECORDS:
+            group = [prepared[i] for i in indices]
+            ks = [(c._dec_ks if decrypt and reverse else c._enc_ks) for c, _, _, _ in group]
+            outs = _np_batch(mode, decrypt, ks, [iv for _, iv, _, _ in group],
+                             [data for _, _, data, _ in group], length)
+        else:
+            outs = [_batch_one(prepared[i], mode, decrypt) for i in indices]
+        for i, out in zip(indices, outs):
+            results[i] = out
+
+    nbytes = 0
+    for i, (_, _, data, as_str) in enumerate(prepared):
+        out = results[i]
+        if unpad and decrypt:
+            out = _strip_padding(out)
+        results[i] = _from_bytes(out, as_str)
+        nbytes += len(data)
+    if metrics is not None:
+        metrics.observe(('batch', mode, 'decrypt' if decrypt else 'encrypt'), nbytes,
+                        perf_counter_ns() - start)
+    return results
+
+def _batch_one(record, mode, decrypt):
+    # One record on the scalar path, padding already applied and not stripped
+    cipher, iv, data, _ = record
+    if mode == 'ctr':
+        out = bytearray(len(data))
+        CTRContext(cipher, iv)._transform(data, out)
+        return out
+    crypt, ks, run, state, _, _, stream = _resolve_mode(cipher, mode, iv, decrypt)
+    length = len(data)
+    full = length - length % 8
+    out = bytearray(length)
+    state = run(crypt, ks, data, out, full, state)
+    if full < length:
+        _xor_tail_into(out, data, full, crypt(*state, ks))
+    return out
+
+def _np_batch(mode, decrypt, schedules, ivs, datas, length):
+    # Runs len(datas) records of length bytes each, record i under
+    # schedules[i], and returns the outputs as a list of bytes
+    np = _numpy_tables()[0]
+    count = len(datas)
+    blocks = length // 8
+    tail = length - blocks * 8
+    ks = np.array(schedules, dtype=np.uint32).T
+
+    def crypt(l, r, lane_ks=ks):
+        return _np_crypt(l, r, lane_ks)
+
+    def flat(l, r, per_record):
+        # All blocks of all records at once; lanes are record-major
+        lane_ks = np.repeat(ks, per_record, axis=1)
+        out_l, out_r = crypt(l.reshape(-1), r.reshape(-1), lane_ks)
+        return out_l.reshape(count, per_record), out_r.reshape(count, per_record)
+
+    words = np.frombuffer(b''.join(data[:blocks * 8] for data in datas), dtype='<u4')
+    words = words.reshape(count, blocks * 2)
+    l, r = words[:, 0::2], words[:, 1::2]
+    out_l = np.empty((count, blocks), dtype=np.uint32)
+    out_r = np.empty((count, blocks), dtype=np.uint32)
+    if mode != 'ecb':
+        iv_words = np.frombuffer(b''.join(iv[:8] for iv in ivs), dtype='<u4').reshape(count, 2)
+        s_l, s_r = iv_words[:, 0].copy(), iv_words[:, 1].copy()
+
+    if mode == 'ecb':
+        out_l[:], out_r[:] = flat(l, r, blocks)
+    elif mode == 'cbc' and not decrypt:
+        for j in range(blocks):
+            s_l, s_r = crypt(l[:, j] ^ s_l, r[:, j] ^ s_r)
+            out_l[:, j], out_r[:, j] = s_l, s_r
+    elif mode == 'cbc':
+        dec_l, dec_r = flat(l, r, blocks)
+        out_l[:] = dec_l ^ np.concatenate((s_l[:, None], l[:, :-1]), axis=1)
+        out_r[:] = dec_r ^ np.concatenate((s_r[:, None], r[:, :-1]), axis=1)
+    elif mode == 'cfb' and not decrypt:
+        for j in range(blocks):
+            k_l, k_r = crypt(s_l, s_r)
+            s_l, s_r = l[:, j] ^ k_l, r[:, j] ^ k_r
+            out_l[:, j], out_r[:, j] = s_l, s_r
+    elif mode == 'cfb':
+        k_l, k_r = flat(np.concatenate((s_l[:, None], l[:, :-1]), axis=1),
+                        np.concatenate((s_r[:, None], r[:, :-1]), axis=1), blocks)
+        out_l[:], out_r[:] = l ^ k_l, r ^ k_r
+        if blocks:
+            s_l, s_r = l[:, -1].copy(), r[:, -1].copy()
+    elif mode == 'ofb':
+        for j in range(blocks):
+            s_l, s_r = crypt(s_l, s_r)
+            out_l[:, j], out_r[:, j] = l[:, j] ^ s_l, r[:, j] ^ s_r
+    elif mode == 'pcbc' and not decrypt:
+        for j in range(blocks):
+            e_l, e_r = crypt(l[:, j] ^ s_l, r[:, j] ^ s_r)
+            out_l[:, j], out_r[:, j] = e_l, e_r
+            s_l, s_r = l[:, j] ^ e_l, r[:, j] ^ e_r
+    elif mode == 'pcbc':
+        for j in range(blocks):
+            d_l, d_r = crypt(l[:, j], r[:, j])
+            p_l, p_r = d_l ^ s_l, d_r ^ s_r
+            out_l[:, j], out_r[:, j] = p_l, p_r
+            s_l, s_r = p_l ^ l[:, j], p_r ^ r[:, j]
+    elif mode == 'ctr':
+        base = np.frombuffer(b''.join(iv[:8] for iv in ivs), dtype='>u8').astype(np.uint64)
+        counters = base[:, None] + np.arange(blocks + 1, dtype=np.uint64)
+        halves = counters.astype('>u8').view('<u4').reshape(count, blocks + 1, 2)
+        k_l, k_r = flat(halves[:, :, 0], halves[:, :, 1], blocks + 1)
+        out_l[:], out_r[:] = l ^ k_l[:, :blocks], r ^ k_r[:, :blocks]
+        s_l, s_r = k_l[:, blocks], k_r[:, blocks]
+
+    out = np.empty((count, blocks * 2), dtype='<u4')
+    out[:, 0::2], out[:, 1::2] = out_l, out_r
+    body = out.view(np.uint8).reshape(count, blocks * 8)
+    if tail:
+        # CFB/OFB: the next keystream block encrypts the state; CTR has it already
+        if mode != 'ctr':
+            s_l, s_r = crypt(s_l, s_r)
+        keystream = np.empty((count, 2), dtype='<u4')
+        keystream[:, 0], keystream[:, 1] = s_l, s_r
+        tails = np.frombuffer(b''.join(data[blocks * 8:] for data in datas), dtype=np.uint8)
+        tails = tails.reshape(count, tail) ^ keystream.view(np.uint8)[:, :tail]
+        body = np.concatenate((body, tails), axis=1)
+    flat_bytes = body.tobytes()
+    return [flat_bytes[i * length:(i + 1) * length] for i in range(count)]
+
+
+class CTRContext:
+    # Counter mode as a seekable keystream. update() can be called with any
+    # amount of data and never buffers; seek() moves to a block index, so a
+    # range of a large object can be decrypted without the data before it.
+
+    def __init__(self, des, iv, offset=0, decrypt=False):
+        if iv is None:
+            raise ValueError("Mode 'ctr' requires an IV.")
+        self.mode = 'ctr'
+        self.decrypt = decrypt
+        self._labels = _update_labels(des, 'ctr', decrypt)
+        self._des = des
+        self._crypt, self._ks = des._core()
+        self._counter = _COUNTER.unpack(_to_bytes(iv)[0][:8])[0]
+        self._pos = offset
+
+    def seek(self, block_index):
+        self._pos = block_index * 8
+
+    def tell(self):
+        # Current byte position in the stream
+        return self._pos
+
+    def _keystream(self, block_index):
+        counter = (self._counter + block_index) & 0xffffffffffffffff
+        return _BLOCK.pack(*self._crypt(*_BLOCK.unpack(_COUNTER.pack(counter)), self._ks))
+
+    def update(self, data):
+        out = bytearray(len(memoryview(data).cast('B')))
+        self.update_into(data, out)
+        return bytes(out)
+
+    def update_into(self, data, out):
+        # update() writing into a writable buffer of the same length, which
+        # may be data itself
+        metrics = _metrics
+        if metrics is None:
+            return self._transform(data, out)
+        start = perf_counter_ns()
+        self._transform(data, out)
+        metrics.count(self._labels, len(memoryview(data).cast('B')), perf_counter_ns() - start)
+
+    def _transform(self, data, out):
+        src = memoryview(data).cast('B')
+        out = memoryview(out).cast('B')
+        n = len(src)
+        pos = self._pos
+        i = 0
+        # Finish a block started by an earlier call or an unaligned offset
+        skip = pos % 8
+        if skip and n:
+            keystream = self._keystream(pos // 8)
+            i = min(8 - skip, n)
+            for j in range(i):
+                out[j] = src[j] ^ keystream[skip + j]
+        full = (n - i) - (n - i) % 8
+        if full:
+            run = self._des._vectorized(_ctr_run, full) or _ctr_run
+            run(self._crypt, self._ks, src[i:i + full], out[i:i + full],
+                full, self._counter + (pos + i) // 8)
+            i += full
+        if i < n:
+            keystream = self._keystream((pos + i) // 8)
+            for j in range(i, n):
+                out[j] = src[j] ^ keystream[j - i]
+        self._pos = pos + n
+
+    def finalize(self):
+        return b''
+
+
+# Memory-mapped file transforms
+
+# Bytes handed to a block loop at a time; large enough for the NumPy backend
+MMAP_WINDOW = 1 << 20
+
+def _mmap_transform(des, mode, decrypt, path, out_path, iv, window):
+    metrics = _metrics
+    if metrics is None:
+        return _mmap_transform_untimed(des, mode, decrypt, path, out_path, iv, window)
+    start = perf_counter_ns()
+    size = os.path.getsize(path)
+    result = _mmap_transform_untimed(des, mode, decrypt, path, out_path, iv, window)
+    metrics.observe(_metric_labels(des, mode, decrypt), size, perf_counter_ns() - start)
+    return result
+
+def _mmap_transform_untimed(des, mode, decrypt, path, out_path, iv, window):
+    if window is None:
+        window = MMAP_WINDOW
+    if window <= 0 or window % 8:
+        raise ValueError("Window must be a positive multiple of 8 bytes.")
+    if mode == 'ctr':
+        if iv is None:
+            raise ValueError("Mode 'ctr' requires an IV.")
+        crypt, ks = des._core()
+        run, state = _ctr_run, _COUNTER.unpack(_to_bytes(iv)[0][:8])[0]
+        pad = unpad = None
+        stream = True
+    else:
+        crypt, ks, run, state, pad, unpad, stream = _resolve_mode(des, mode, iv, decrypt)
+
+    in_size = os.path.getsize(path)
+    if unpad and (in_size == 0 or in_size % 8):
+        raise ValueError("Data length must be a non-zero multiple of 8 bytes.")
+    if not (pad or stream) and in_size % 8:
+        raise ValueError("Data length must be a multiple of 8 bytes.")
+    full = in_size - in_size % 8
+    out_size = full + 8 if pad else in_size
+
+    import mmap
+    # out_path naming the input itself is an in-place transform; opening it
+    # 'w+b' would truncate the input before it is read
+    in_place = out_path is None or _same_file(path, out_path)
+    f_out = open(path if in_place else out_path, 'r+b' if in_place else 'w+b')
+    with f_out:
+        f_out.truncate(out_size)
+        if in_place:
+            f_in = None
+            src_map = dst_map = mmap.mmap(f_out.fileno(), out_size) if out_size else None
+        else:
+            f_in = open(path, 'rb')
+            src_map = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) if in_size else None
+            dst_map = mmap.mmap(f_out.fileno(), out_size) if out_size else None
+        try:
+            if out_size:
+                src, dst = memoryview(src_map if src_map is not None else b''), memoryview(dst_map)
+                try:
+                    # Copy the partial block first; in place, padding overwrites it
+                    tail = bytes(src[full:in_size])
+                    for start in range(0, full, window):
+                        n = min(window, full - start)
+                        block_run = des._vectorized(run, n) or run
+                        state = block_run(crypt, ks, src[start:start + n], dst[start:start + n], n, state)
+                    if pad:
+                        out = bytearray(8)
+                        run(crypt, ks, pad(tail), out, 8, state)
+                        dst[full:] = out
+                    elif tail:
+                        if mode == 'ctr':
+                            keystream = crypt(*_BLOCK.unpack(_COUNTER.pack(state & 0xffffffffffffffff)), ks)
+                        else:
+                            keystream = crypt(*state, ks)
+                        out = bytearray(len(tail))
+                        _xor_tail_into(out, tail, 0, keystream)
+                        dst[full:] = out
+                    if unpad:
+                        out_size -= 8 - len(unpad(bytes(dst[-8:])))
+                finally:
+                    src.release()
+                    dst.release()
+                dst_map.flush()
+        finally:
+            if dst_map is not None:
+                dst_map.close()
+            if src_map is not None and src_map is not dst_map:
+                src_map.close()
+            if f_in is not None:
+                f_in.close()
+        if unpad:
+            f_out.truncate(out_size)
+    return out_size
+
+def _same_file(path, other):
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return os.path.abspath(path) == os.path.abspath(other)
+
+
+# asyncio streams
+
+# Bytes read from a StreamReader source at a time
+ASYNC_CHUNK_SIZE = 64 * 1024
+
+# Chunks smaller than this run on the event loop. The scalar core takes
+# about 14us a block and an executor round trip about 75us, so past a few
+# blocks the hand-off is cheaper and the loop stalls for at most ~0.1 ms.
+ASYNC_INLINE_BYTES = 64
+
+async def _stream_async(context, source, executor, chunk_size, inline_bytes):
+    # The context carries the chaining state from one chunk to the next.
+    # Only one update is in flight at a time, so the order is kept.
+    import asyncio
+    loop = asyncio.get_running_loop()
+    if chunk_size is None:
+        chunk_size = ASYNC_CHUNK_SIZE
+    if inline_bytes is None:
+        inline_bytes = ASYNC_INLINE_BYTES
+    read = getattr(source, 'read', None)
+    if read is not None:
+        async def chunks():
+            while True:
+                data = await read(chunk_size)
+                if not data:
+                    return
+                yield data
+        chunks = chunks()
+    else:
+        chunks = source
+    async for data in chunks:
+        if len(data) < inline_bytes:
+            out = context.update(data)
+        else:
+            out = await loop.run_in_executor(executor, context.update, data)
+        if out:
+            yield out
+    out = context.finalize()
+    if out:
+        yield out
+
+
+# File objects. DESReader decrypts (or encrypts) another binary stream as it
+# is read and DESWriter encrypts (or decrypts) what is written to it before
+# passing it on, so they compose with gzip, tarfile and anything else taking
+# a file object:
+#
+#     with DESReader(open('backup.tar.gz.enc', 'rb'), des) as reader:
+#         with tarfile.open(fileobj=reader, mode='r|gz') as tar:
+#             tar.extractall(dest)
+#
+# Closing either one closes the wrapped stream.
+
+class DESReader(io.RawIOBase):
+    # readinto() reads ciphertext straight into the caller's buffer and
+    # transforms it there, so no intermediate copies are made once the
+    # buffer holds at least two blocks; smaller reads go through an internal
+    # buffer. In CTR mode the reader is seekable when the raw stream is.
+
+    def __init__(self, raw, des, mode='ecb', iv=None, decrypt=True, buffer_size=ASYNC_CHUNK_SIZE):
+        self.raw = raw
+        self.mode = mode
+        self.decrypt = decrypt
+        self._des = des
+        if mode == 'ctr':
+            self._ctr = CTRContext(des, iv)
+        else:
+            self._ctr = None
+            (self._crypt, self._ks, self._run, self._state,
+             self._pad, self._unpad, self._stream) = _resolve_mode(des, mode, iv, decrypt)
+        self._labels = _update_labels(des, mode, decrypt)
+        self._carry = b''
+        self._pending = memoryview(b'')
+        self._scratch = bytearray(max(buffer_size - buffer_size % 8, 16))
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._ctr is not None and self.raw.seekable()
+
+    def tell(self):
+        if self._ctr is None:
+            raise io.UnsupportedOperation("seek")
+        return self._ctr.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if not self.seekable():
+            raise io.UnsupportedOperation("seek")
+        # CTR ciphertext and plaintext positions are the same
+        pos = self.raw.seek(offset, whence)
+        self._ctr._pos = pos
+        return pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        if not self._pending and self._ctr is not None:
+            n = self._raw_readinto(view)
+            self._ctr.update_into(view[:n], view[:n])
+            return n
+        if not self._pending and len(view) >= 16:
+            return self._timed_fill(view)
+        if not self._pending:
+            n = self._timed_fill(memoryview(self._scratch))
+            self._pending = memoryview(self._scratch)[:n]
+        n = min(len(view), len(self._pending))
+        view[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def _raw_readinto(self, view):
+        readinto = getattr(self.raw, 'readinto', None)
+        if readinto is not None:
+            return readinto(view) or 0
+        data = self.raw.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def _timed_fill(self, view):
+        metrics = _metrics
+        if metrics is None:
+            return self._fill(view)
+        start = perf_counter_ns()
+        n = self._fill(view)
+        metrics.count(self._labels, n, perf_counter_ns() - start)
+        return n
+
+    def _fill(self, view):
+        # Transforms at least one block into view (at least 16 bytes long)
+        # and returns how many bytes are ready, or 0 at the end
+        while not self._eof:
+            carried = len(self._carry)
+            view[:carried] = self._carry
+            got = self._raw_readinto(view[carried:])
+            total = carried + got
+            if not got:
+                self._eof = True
+                self._carry = b''
+                return self._final(view, total)
+            n = total - total % 8
+            if self._unpad and n == total:
+                # Hold back the last block; it may carry padding
+                n -= 8
+            self._carry = bytes(view[n:total])
+            if n > 0:
+                run = self._des._vectorized(self._run, n) or self._run
+                self._state = run(self._crypt, self._ks, view[:n], view[:n], n, self._state)
+                return n
+        return 0
+
+    def _final(self, view, n):
+        # The input has ended with n bytes in view
+        if self._pad:
+            view[:8] = self._pad(view[:n].tobytes())
+            self._state = self._run(self._crypt, self._ks, view[:8], view[:8], 8, self._state)
+            return 8
+        if self._stream:
+            if n:
+                _xor_tail_into(view, view[:n].tobytes(), 0, self._crypt(*self._state, self._ks))
+            return n
+        if self._unpad:
+            if n != 8:
+                raise ValueError("Data length must be a non-zero multiple of 8 bytes.")
+            self._state = self._run(self._crypt, self._ks, view[:8], view[:8], 8, self._state)
+            return len(self._unpad(view[:8]))
+        if n:
+            raise ValueError("Data length must be a multiple of 8 bytes.")
+        return 0
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.raw.close()
+            finally:
+                super().close()
+
+
+class DESWriter(io.RawIOBase):
+    # Every write() is passed through a CipherContext (or CTRContext) and
+    # the complete blocks are written to the raw stream at once; close()
+    # writes the final block, padding included.
+
+    def __init__(self, raw, des, mode='ecb', iv=None, decrypt=False):
+        self.raw = raw
+        self.mode = mode
+        self.decrypt = decrypt
+        self._context = des.decryptor(mode, iv) if decrypt else des.encryptor(mode, iv)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = memoryview(b).cast('B')
+        out = self._context.update(data)
+        if out:
+            self.raw.write(out)
+        return len(data)
+
+    def flush(self):
+        if not self.closed:
+            self.raw.flush()
+
+    def close(self):
+        if not self.closed:
+            try:
+                out = self._context.finalize()
+                if out:
+                    self.raw.write(out)
+                self.raw.flush()
+            finally:
+                try:
+                    self.raw.close()
+                finally:
+                    super().close()
+
+
+# Parallel engine. ECB in both directions, CBC decryption and CTR have no
+# dependency between output blocks (CBC decryption only needs the previous
+# ciphertext block, which is part of the input, and a CTR block only its
+# index), so block-aligned ranges can be handed to separate processes. Input
+# and output live in shared memory so only the segment names and offsets are
+# pickled, and each worker builds the key schedule once in its initializer.
+
+# Below this size the pool round trip costs more than it saves
+PARALLEL_MIN_BYTES = 1 << 20
+
+_worker_des = None
+
+def _parallel_init(key_str):
+    global _worker_des
+    _worker_des = DES(key_str)
+
+def _parallel_run(job, src_name, dst_name, start, end, state):
+    # Runs one block-aligned range [start, end) of a job in a worker
+    from multiprocessing import shared_memory
+    run, decrypt = _PARALLEL_JOBS[job]
+    src_shm = shared_memory.SharedMemory(name=src_name)
+    dst_shm = shared_memory.SharedMemory(name=dst_name)
+    try:
+        src = src_shm.buf[start:end]
+        dst = dst_shm.buf[start:end]
+        crypt, ks = _worker_des._core(decrypt)
+        run = _worker_des._vectorized(run, end - start) or run
+        run(crypt, ks, src, dst, end - start, state)
+        src.release()
+        dst.release()
+    finally:
+        src_shm.close()
+        dst_shm.close()
+
+# job -> (block loop, uses the decryption schedule)
+_PARALLEL_JOBS = {
+    'ecb-encrypt': (_ecb_run, False),
+    'ecb-decrypt': (_ecb_run, True),
+    'cbc-decrypt': (_cbc_decrypt_run, True),
+    'ctr': (_ctr_run, False),
+}
+
+
+class ParallelDES:
+    # Spreads ECB, CBC decryption and CTR over a process pool. The other
+    # modes are inherently sequential and run in this process through the
+    # wrapped DES. Results are identical to DES; inputs smaller than
+    # min_parallel_bytes skip the pool entirely. Use as a context manager or
+    # call close().
+
+    def __init__(self, key_str, workers=None, min_parallel_bytes=PARALLEL_MIN_BYTES):
+        self.des = DES(key_str)
+        self.key_str = key_str
+        self.workers = workers or os.cpu_count() or 1
+        self.min_parallel_bytes = min_parallel_bytes
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_parallel_init,
+                                             initargs=(self.key_str,))
+        return self._pool
+
+    def encrypt_ecb(self, plaintext):
+        data, as_str = _to_bytes(plaintext)
+        return _from_bytes(self._run('ecb-encrypt', _pad(data)), as_str)
+
+    def decrypt_ecb(self, ciphertext):
+        data, as_str = _to_bytes(ciphertext)
+        _check_aligned(data)
+        return _from_bytes(_strip_padding(self._run('ecb-decrypt', data)), as_str)
+
+    def decrypt_cbc(self, ciphertext, iv):
+        data, as_str = _to_bytes(ciphertext)
+        _check_aligned(data)
+
+        def state_at(start):
+            # Chain from the ciphertext block before the range
+            return _iv_longs(iv) if start == 0 else _block_unpack_from(data, start - 8)
+
+        return _from_bytes(_strip_padding(self._run('cbc-decrypt', data, state_at)), as_str)
+
+    def encrypt_ctr(self, plaintext, iv, offset=0):
+        data, as_str = _to_bytes(plaintext)
+        full = len(data) - len(data) % 8
+        if offset % 8 or full < self.min_parallel_bytes:
+            return self.des.encrypt_ctr(plaintext, iv, offset)
+        counter = _COUNTER.unpack(_to_bytes(iv)[0][:8])[0] + offset // 8
+        out = self._run('ctr', memoryview(data)[:full], lambda start: counter + start // 8)
+        out += self.des.encrypt_ctr(data[full:], iv, offset + full)
+        return _from_bytes(out, as_str)
+
+    def decrypt_ctr(self, ciphertext, iv, offset=0):
+        return self.encrypt_ctr(ciphertext, iv, offset)
+
+    def encrypt(self, data):
+        _check_aligned(data)
+        return bytes(self._run('ecb-encrypt', data))
+
+    def decrypt(self, data):
+        _check_aligned(data)
+        return bytes(self._run('ecb-decrypt', data))
+
+    def __getattr__(self, name):
+        # encrypt_cbc, the CFB/OFB/PCBC methods and the incremental interface.
+        # self.des itself is missing before __init__ has run (unpickling,
+        # copy) and looking it up here would recurse.
+        if name == 'des':
+            raise AttributeError(name)
+        return getattr(self.des, name)
+
+    def _run(self, job, data, state_at=None):
+        # Runs a job over block-aligned data into a new bytearray.
+        # state_at(start) gives the chaining state for a range starting at
+        # byte offset start.
+        length = len(data)
+        if not length:
+            # Shared memory segments cannot be empty
+            return bytearray()
+        if self.workers < 2 or length < self.min_parallel_bytes:
+            run, decrypt = _PARALLEL_JOBS[job]
+            out = bytearray(length)
+            crypt, ks = self.des._core(decrypt)
+            run = self.des._vectorized(run, length) or run
+            run(crypt, ks, data, out, length, state_at(0) if state_at else None)
+            return out
+
+        from multiprocessing import shared_memory
+        src_shm = shared_memory.SharedMemory(create=True, size=length)
+        try:
+            dst_shm = shared_memory.SharedMemory(create=True, size=length)
+            try:
+                src_shm.buf[:length] = data
+                # A few ranges per worker keeps them busy if one falls behind
+                blocks = length // 8
+                per_range = -(-blocks // (self.workers * 4)) * 8
+                futures = []
+                for start in range(0, length, per_range):
+                    end = min(start + per_range, length)
+                    state = state_at(start) if state_at else None
+                    futures.append(self._get_pool().submit(
+                        _parallel_run, job, src_shm.name, dst_shm.name, start, end, state))
+                for future in futures:
+                    future.result()
+                return bytearray(dst_shm.buf[:length])
+            finally:
+                dst_shm.close()
+                dst_shm.unlink()
+        finally:
+            src_shm.close()
+            src_shm.unlink()
+
+
+# Buffer helpers shared by the mode methods
+
+def _to_bytes(data):
+    # Returns (bytes-like, was_str). Strings are mapped byte-for-byte via latin-1.
+    if isinstance(data, str):
+        return data.encode('latin-1'), True
+    if isinstance(data, (bytes, bytearray)):
+        return data, False
+    return memoryview(data).cast('B').tobytes(), False
+
+def _from_bytes(data, as_str):
+    if as_str:
+        return data.decode('latin-1')
+    return bytes(data)
+
+def _iv_longs(iv):
+    return _block_unpack_from(_to_bytes(iv)[0], 0)
+
+def _check_aligned(data):
+    if len(data) % 8:
+        raise ValueError("Data length must be a multiple of 8 bytes.")
+
+def _pad(data):
+    padding_len = 8 - (len(data) % 8)
+    return data + bytes((padding_len,)) * padding_len
+
+def _strip_padding(data):
+    if not data:
+        raise ValueError("Cannot remove padding from empty data.")
+    # PKCS#5: the last byte is a count of 1-8 and every padding byte holds
+    # that count. Anything else is a wrong key or corrupt data.
+    padding_len = data[-1]
+    end = len(data) - padding_len
+    if not 1 <= padding_len <= 8 or data[end:] != bytes((padding_len,) * padding_len):
+        raise ValueError("Invalid padding.")
+    return data[:end]
+
+def _pad_des1(data):
+    # des(1): random fill up to the last byte of the block, which holds the
+    # number of data bytes in the block (0-7)
+    count = len(data) % 8
+    return data + os.urandom(7 - count) + bytes((count,))
+
+def _strip_des1(data):
+    if not data:
+        raise ValueError("Cannot remove padding from empty data.")
+    count = data[-1]
+    if count > 7:
+        raise ValueError("Invalid padding.")
+    return data[:len(data) - 8 + count]
+
+# padding name in _MODES -> (pad, strip)
+_PADDINGS = {
+    'pkcs5': (_pad, _strip_padding),
+    'des1': (_pad_des1, _strip_des1),
+}
+
+def _xor_tail_into(out, data, offset, keystream):
+    ks = _BLOCK.pack(*keystream)
+    for i in range(offset, len(data)):
+        out[i] = data[i] ^ ks[i - offset]
@@ -0,0 +1,452 @@
+import argparse
+import hmac
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+
+import des
+from des import DES
+
+# Chunked, indexed container for DES ciphertext.
+#
+#   header   magic "DESC", version, mode, key id length, chunk size, key id
+#   chunks   each an 8-byte IV followed by the chunk encrypted on its own
+#   index    per chunk: file offset, stored length (IV included), plaintext length
+#   trailer  index offset, chunk count, plaintext size, magic "DESX"
+#
+# Every chunk is chained from its own IV, so any chunk can be decrypted
+# without the ones before it and chunks can be encrypted or decrypted on
+# separate cores. All chunks hold chunk_size plaintext bytes except the last.
+
+MAGIC = b'DESC'
+TRAILER_MAGIC = b'DESX'
+VERSION = 1
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_HEADER = struct.Struct('<4sBBHI')
+_INDEX_ENTRY = struct.Struct('<QII')
+_TRAILER = struct.Struct('<QIQ4s')
+
+MODES = ('ecb', 'cbc', 'cfb', 'ofb', 'pcbc', 'ctr')
+
+def _encrypt_chunk(cipher, mode, iv, data):
+    if mode == 'ecb':
+        return cipher.encrypt_ecb(data)
+    if mode == 'cbc':
+        # encrypt_cbc takes aligned input; decrypt_cbc strips the padding
+        return cipher.encrypt_cbc(des._pad(data), iv)
+    return getattr(cipher, 'encrypt_' + mode)(data, iv)
+
+def _decrypt_chunk(cipher, mode, iv, data):
+    if mode == 'ecb':
+        return cipher.decrypt_ecb(data)
+    return getattr(cipher, 'decrypt_' + mode)(data, iv)
+
+# Pool workers build their DES once in des._parallel_init, as ParallelDES does
+
+def _pool_encrypt_chunk(mode, iv, data):
+    return _encrypt_chunk(des._worker_des, mode, iv, data)
+
+def _pool_decrypt_chunk(mode, iv, data):
+    return _decrypt_chunk(des._worker_des, mode, iv, data)
+
+def _make_pool(key_str, workers):
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(workers, initializer=des._parallel_init, initargs=(key_str,))
+
+# Secret for key fingerprints, new in every process; the cache keys built
+# from them never leave the process
+_FINGERPRINT_SECRET = os.urandom(32)
+
+def key_fingerprint(cipher):
+    # Keyed hash of the key, identifying it in cache keys. A check value (the
+    # encryption of a zero block) is a known plaintext/ciphertext pair that
+    # lets a 56-bit key be searched for exhaustively; this is not, and it is
+    # only comparable within the process that made it.
+    return hmac.new(_FINGERPRINT_SECRET, bytes(cipher.key_cblock), 'sha256').hexdigest()
+
+
+class ChunkCache:
+    # Read-through cache of decrypted chunks keyed by
+    # (object id, key fingerprint, chunk index), evicting least recently used
+    # chunks once their total size exceeds max_bytes. With zero_evicted,
+    # chunks are kept in bytearrays that are overwritten with zeros when
+    # evicted or cleared, and hits return a copy. One cache can be shared
+    # between readers and threads.
+
+    def __init__(self, max_bytes, zero_evicted=False):
+        self.max_bytes = max_bytes
+        self.zero_evicted = zero_evicted
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_saved += len(entry)
+            self._entries.move_to_end(key)
+            return bytes(entry) if self.zero_evicted else entry
+
+    def put(self, key, data):
+        entry = bytearray(data) if self.zero_evicted else bytes(data)
+        with self._lock:
+            if len(entry) > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._discard(old)
+            self._entries[key] = entry
+            self.bytes += len(entry)
+            self._evict(self.max_bytes)
+
+    def get_or_load(self, key, load):
+        # Returns the cached chunk, or calls load() and caches its result.
+        # load runs outside the lock, so concurrent misses may both load.
+        data = self.get(key)
+        if data is None:
+            data = load()
+            self.put(key, data)
+        return data
+
+    def _discard(self, entry):
+        self.bytes -= len(entry)
+        if self.zero_evicted:
+            entry[:] = bytes(len(entry))
+
+    def _evict(self, max_bytes):
+        while self.bytes > max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self._discard(entry)
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict(max(max_bytes, 0))
+
+    def clear(self):
+        with self._lock:
+            self._evict(0)
+            self.hits = self.misses = self.evictions = self.bytes_saved = 0
+
+    def info(self):
+        # Returns a dict with hits, misses, hit_ratio, bytes_saved (plaintext
+        # served without decrypting), evictions, entries, bytes and max_bytes
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': self.hits / lookups if lookups else 0.0,
+                    'bytes_saved': self.bytes_saved, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+
+class ContainerWriter:
+    # Writes a container to a binary file object. write() can be called with
+    # any amount of data; close() writes the last chunk, the index and the
+    # trailer. When the with block raises, abort() runs instead and the file
+    # is left without a trailer, so ContainerReader rejects it rather than
+    # reading a truncated container as complete. With workers > 1 full chunks
+    # are encrypted on a process pool, at most two per worker in flight, and
+    # written in order.
+
+    def __init__(self, f, key_str, mode='cbc', chunk_size=DEFAULT_CHUNK_SIZE, key_id='', workers=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode!r}")
+        if chunk_size <= 0 or chunk_size % 8:
+            raise ValueError("Chunk size must be a positive multiple of 8 bytes.")
+        key_id_bytes = key_id.encode('utf-8')
+        self.f = f
+        self.des = DES(key_str)
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.key_id = key_id
+        self.workers = workers or 1
+        self._pool = _make_pool(key_str, self.workers) if self.workers > 1 else None
+        self._in_flight = []
+        self._buffer = bytearray()
+        self._index = []
+        self._size = 0
+        self._closed = False
+        f.write(_HEADER.pack(MAGIC, VERSION, MODES.index(mode), len(key_id_bytes), chunk_size))
+        f.write(key_id_bytes)
+        self._offset = _HEADER.size + len(key_id_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, data):
+        if self._closed:
+            raise ValueError("Container already closed.")
+        buffer = self._buffer
+        buffer += data
+        chunk_size = self.chunk_size
+        full = len(buffer) - len(buffer) % chunk_size
+        for start in range(0, full, chunk_size):
+            self._add_chunk(bytes(buffer[start:start + chunk_size]))
+        del buffer[:full]
+        return len(data)
+
+    def _add_chunk(self, plain):
+        iv = bytes(8) if self.mode == 'ecb' else os.urandom(8)
+        if self._pool is None:
+            self._write_chunk(iv, len(plain), _encrypt_chunk(self.des, self.mode, iv, plain))
+            return
+        self._in_flight.append((iv, len(plain), self._pool.submit(_pool_encrypt_chunk, self.mode, iv, plain)))
+        while len(self._in_flight) >= 2 * self.workers:
+            self._write_oldest()
+
+    def _write_oldest(self):
+        iv, plain_len, future = self._in_flight.pop(0)
+        self._write_chunk(iv, plain_len, future.result())
+
+    def _write_chunk(self, iv, plain_len, ciphertext):
+        self.f.write(iv)
+        self.f.write(ciphertext)
+        stored = 8 + len(ciphertext)
+        self._index.append((self._offset, stored, plain_len))
+        self._offset += stored
+        self._size += plain_len
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._buffer:
+                self._add_chunk(bytes(self._buffer))
+                self._buffer = bytearray()
+            while self._in_flight:
+                self._write_oldest()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+        index_offset = self._offset
+        for entry in self._index:
+            self.f.write(_INDEX_ENTRY.pack(*entry))
+        self.f.write(_TRAILER.pack(index_offset, len(self._index), self._size, TRAILER_MAGIC))
+        self.f.flush()
+
+    def abort(self):
+        # Stops without writing the index or trailer
+        if self._closed:
+            return
+        self._closed = True
+        for _, _, future in self._in_flight:
+            future.cancel()
+        self._in_flight = []
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+class ContainerReader:
+    # Random access to a container in a seekable binary file object. Only
+    # the chunks covering a requested range are read and decrypted; with
+    # workers > 1 ranges spanning several chunks are decrypted on a process
+    # pool. key_id, when given, must match the one in the header. With a
+    # ChunkCache, decrypted chunks are looked up under object_id (the file
+    # name by default) before anything is read.
+
+    def __init__(self, f, key_str, key_id=None, workers=None, cache=None, object_id=None):
+        self.f = f
+        self.key_str = key_str
+        self.des = DES(key_str)
+        self.workers = workers or 1
+        self.cache = cache
+        if object_id is None:
+            object_id = getattr(f, 'name', None) or id(self)
+        self.object_id = object_id
+        self._fingerprint = key_fingerprint(self.des) if cache is not None else None
+        self._pool = None
+        self._lock = threading.Lock()
+
+        file_size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError("Not a DES container.")
+        magic, version, mode, key_id_len, chunk_size = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("Not a DES container.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported container version: {version}")
+        if mode >= len(MODES):
+            raise ValueError(f"Unknown mode code: {mode}")
+        self.mode = MODES[mode]
+        self.chunk_size = chunk_size
+        self.key_id = f.read(key_id_len).decode('utf-8')
+        if key_id is not None and key_id != self.key_id:
+            raise ValueError(f"Container key id {self.key_id!r} does not match {key_id!r}.")
+
+        # A header-only file (left by an aborted writer) has no room for one
+        header_end = f.tell()
+        trailer_offset = file_size - _TRAILER.size
+        if trailer_offset < header_end:
+            raise ValueError("Container trailer is missing or damaged.")
+        f.seek(trailer_offset)
+        trailer = f.read(_TRAILER.size)
+        if len(trailer) != _TRAILER.size:
+            raise ValueError("Container trailer is missing or damaged.")
+        index_offset, count, self.size, magic = _TRAILER.unpack(trailer)
+        if magic != TRAILER_MAGIC:
+            raise ValueError("Container trailer is missing or damaged.")
+        index_size = count * _INDEX_ENTRY.size
+        if index_offset < header_end or index_offset + index_size > trailer_offset:
+            raise ValueError("Container index is truncated or out of range.")
+        f.seek(index_offset)
+        index = f.read(index_size)
+        if len(index) != index_size:
+            raise ValueError("Container index is truncated or out of range.")
+        self.index = [_INDEX_ENTRY.unpack_from(index, i * _INDEX_ENTRY.size) for i in range(count)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def chunk_count(self):
+        return len(self.index)
+
+    def _read_stored(self, i):
+        # (iv, ciphertext) of chunk i
+        offset, stored, _ = self.index[i]
+        with self._lock:
+            self.f.seek(offset)
+            data = self.f.read(stored)
+        if len(data) != stored:
+            raise ValueError(f"Chunk {i} is truncated.")
+        return data[:8], data[8:]
+
+    def _decrypt_stored(self, i):
+        iv, ciphertext = self._read_stored(i)
+        return _decrypt_chunk(self.des, self.mode, iv, ciphertext)
+
+    def _cache_key(self, i):
+        return (self.object_id, self._fingerprint, i)
+
+    def read_chunk(self, i):
+        # Plaintext of chunk i
+        if self.cache is None:
+            return self._decrypt_stored(i)
+        return self.cache.get_or_load(self._cache_key(i), lambda: self._decrypt_stored(i))
+
+    def read_chunks(self, first, last):
+        # Plaintexts of chunks first..last inclusive, in order
+        indices = range(first, last + 1)
+        if self.workers < 2 or len(indices) < 2:
+            return [self.read_chunk(i) for i in indices]
+        chunks = [None] * len(indices)
+        if self.cache is not None:
+            for n, i in enumerate(indices):
+                chunks[n] = self.cache.get(self._cache_key(i))
+        missing = [n for n, chunk in enumerate(chunks) if chunk is None]
+        if len(missing) < 2:
+            results = [self._decrypt_stored(indices[n]) for n in missing]
+        else:
+            if self._pool is None:
+                self._pool = _make_pool(self.key_str, self.workers)
+            futures = [self._pool.submit(_pool_decrypt_chunk, self.mode, *self._read_stored(indices[n]))
+                       for n in missing]
+            results = [future.result() for future in futures]
+        for n, chunk in zip(missing, results):
+            chunks[n] = chunk
+            if self.cache is not None:
+                self.cache.put(self._cache_key(indices[n]), chunks[n])
+        return chunks
+
+    def read_range(self, offset, length):
+        # length plaintext bytes from offset, clipped to the end
+        if offset < 0 or length < 0:
+            raise ValueError("Offset and length must not be negative.")
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        first = offset // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        data = b''.join(self.read_chunks(first, last))
+        start = offset - first * self.chunk_size
+        return data[start:start + (end - offset)]
+
+    def read_all(self):
+        if not self.index:
+            return b''
+        return b''.join(self.read_chunks(0, len(self.index) - 1))
+
+    def decrypt_to(self, f_out, batch_chunks=64):
+        # Writes the whole plaintext to f_out, a batch of chunks at a time
+        for first in range(0, len(self.index), batch_chunks):
+            last = min(first + batch_chunks, len(self.index)) - 1
+            for chunk in self.read_chunks(first, last):
+                f_out.write(chunk)
+        return self.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack or unpack a chunked DES container.")
+    parser.add_argument("command", choices=("pack", "unpack"))
+    parser.add_argument("-k", "--key", required=True, help="8-byte DES key.")
+    parser.add_argument("input_filename")
+    parser.add_argument("output_filename")
+    parser.add_argument("--mode", default="cbc", choices=MODES, help="Cipher mode for pack (default: cbc).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Plaintext bytes per chunk for pack (default: {DEFAULT_CHUNK_SIZE}).")
+    parser.add_argument("--key-id", default="", help="Key identifier stored in (or checked against) the header.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: 1).")
+
+    args = parser.parse_args()
+
+    if len(args.key) != 8:
+        print("Error: Key must be exactly 8 bytes long.", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        with open(args.input_filename, 'rb') as f_in, open(args.output_filename, 'wb') as f_out:
+            if args.command == 'pack':
+                with ContainerWriter(f_out, args.key, args.mode, args.chunk_size, args.key_id,
+                                     args.workers) as writer:
+                    while True:
+                        data = f_in.read(args.chunk_size)
+                        if not data:
+                            break
+                        writer.write(data)
+            else:
+                with ContainerReader(f_in, args.key, args.key_id or None, args.workers) as reader:
+                    reader.decrypt_to(f_out)
+    except FileNotFoundError as e:
+        print(f"Error: File '{e.filename}' not found.", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"File '{args.input_filename}' {args.command}ed to '{args.output_filename}' successfully.")
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,318 @@
+import io
 import json
 import os
-import subprocess
+import threading
+import time
 import boto3
-import tempfile
-from typing import Dict, Any, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from urllib.parse import unquote_plus
+import des
+from des import DES
+
+# Key used to decrypt uploaded objects (same string the des binary took via -k)
+DES_KEY = os.environ.get('DES_KEY', 'my_key')
+
+# Format of the uploaded objects: what `des -k KEY` writes (CBC from a zero
+# IV, the last block ending in a count of its data bytes)
+DES_MODE = 'des1-cbc'
+
+# Bytes pulled from the S3 body per read; a multiple of the 8-byte block
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Records of one event processed at the same time
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '4'))
+
+# Objects at least this large go through the ranged-GET / multipart pipeline.
+# Parts are PART_SIZE bytes (a multiple of 8, above the 5 MiB S3 minimum) and
+# up to PIPELINE_WORKERS ranges are fetched and uploaded at the same time.
+PART_SIZE = int(os.environ.get('PART_SIZE', str(8 * 1024 * 1024)))
+PIPELINE_MIN_BYTES = int(os.environ.get('PIPELINE_MIN_BYTES', str(2 * PART_SIZE)))
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', '4'))
+
+# Optional endpoint for a local S3 stand-in (moto, MinIO, ...)
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+
+# With DES_METRICS=1 the cipher records throughput, latency and key-setup
+# metrics, and every invocation ends with one JSON log line holding the
+# container's cumulative snapshot (CloudWatch Logs Insights can query it)
+if os.environ.get('DES_METRICS', '').lower() in ('1', 'true', 'yes'):
+    des.enable_metrics()
+
+# Created on first use and kept for the life of the container, so warm
+# invocations skip client and key setup. Both are safe to share between the
+# worker threads: boto3 clients are thread-safe and DES objects hold no
+# per-message state.
+_s3_client = None
+_ciphers: Dict[str, DES] = {}
+_init_lock = threading.Lock()
+
+
+def get_s3_client() -> Any:
+    global _s3_client
+    with _init_lock:
+        if _s3_client is None:
+            _s3_client = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
+        return _s3_client
+
+
+def get_cipher(key: str = DES_KEY) -> DES:
+    with _init_lock:
+        cipher = _ciphers.get(key)
+        if cipher is None:
+            cipher = _ciphers[key] = DES(key)
+        return cipher
+
+
+def decrypting_reader(body: Any, cipher: DES) -> io.BufferedReader:
+    """
+    Wraps the S3 StreamingBody in a file-like object yielding its plaintext.
+
+    upload_fileobj pulls from it directly: nothing is staged in /tmp and only
+    about one chunk is in memory. The buffering layer keeps reads full-sized.
+    """
+    return io.BufferedReader(des.DESReader(body, cipher, DES_MODE), READ_CHUNK_SIZE)
+
+
+def pipelined_decrypt(s3_client: Any, bucket_name: str, object_key: str, output_key: str,
+                      cipher: DES, size: int, part_size: int = PART_SIZE,
+                      workers: int = PIPELINE_WORKERS) -> int:
+    """
+    Decrypts a large object with overlapping download, decryption and upload.
+
+    Block-aligned byte ranges are fetched in parallel, fed in order through one
+    decryptor as they arrive, and each decrypted range is sent as a part of
+    a multipart upload. At most `workers` ranges are downloading and `workers`
+    parts uploading at any time, so memory stays bounded whatever the object
+    size, and the total time approaches the slower of network and CPU.
+
+    Args:
+        s3_client: S3 client used for the ranged GETs and the upload
+        bucket_name: Bucket holding the object and receiving the output
+        object_key: Key of the encrypted object
+        output_key: Key of the decrypted object
+        cipher: DES instance for the object's key
+        size: Size of the encrypted object in bytes
+        part_size: Range and part size, a multiple of 8
+        workers: Ranges downloading and parts uploading at the same time
+
+    Returns:
+        Number of parts uploaded
+    """
+    if part_size <= 0 or part_size % 8:
+        raise ValueError("Part size must be a positive multiple of 8 bytes.")
+    ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+    decryptor = cipher.decryptor(DES_MODE)
+
+    def fetch(first: int, last: int) -> bytes:
+        body = s3_client.get_object(Bucket=bucket_name, Key=object_key,
+                                    Range=f"bytes={first}-{last}")['Body']
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def upload(part_number: int, data: bytes) -> Dict[str, Any]:
+        response = s3_client.upload_part(Bucket=bucket_name, Key=output_key, UploadId=upload_id,
+                                         PartNumber=part_number, Body=data)
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket_name, Key=output_key)['UploadId']
+    try:
+        parts = []
+        with ThreadPoolExecutor(max_workers=workers) as fetch_pool, \
+                ThreadPoolExecutor(max_workers=workers) as upload_pool:
+            fetches = deque()
+            uploads = deque()
+            next_range = 0
+            for index in range(len(ranges)):
+                # Keep the download queue full
+                while next_range < len(ranges) and len(fetches) < workers:
+                    fetches.append(fetch_pool.submit(fetch, *ranges[next_range]))
+                    next_range += 1
+
+                # The decryptor carries the CBC chain from range to range and
+                # only holds back the final block
+                data = decryptor.update(fetches.popleft().result())
+                if index == len(ranges) - 1:
+                    data += decryptor.finalize()
+
+                # Wait for the oldest upload before queueing more than workers parts
+                while len(uploads) >= workers:
+                    parts.append(uploads.popleft().result())
+                uploads.append(upload_pool.submit(upload, index + 1, data))
+            while uploads:
+                parts.append(uploads.popleft().result())
+
+        s3_client.complete_multipart_upload(Bucket=bucket_name, Key=output_key, UploadId=upload_id,
+                                            MultipartUpload={'Parts': parts})
+        return len(parts)
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=output_key, UploadId=upload_id)
+        raise
+
+
+def process_record(s3_client: Any, record: Dict[str, Any]) -> Optional[str]:
+    """
+    Decrypts the object named by one S3 event record.
+
+    Args:
+        s3_client: S3 client used for the download and the upload
+        record: One entry of the event's Records list
+
+    Returns:
+        The output key, or None when the record was skipped
+    """
+    # Extract S3 information from the event
+    s3_info = record.get('s3', {})
+    bucket_name = s3_info.get('bucket', {}).get('name')
+    object_key = unquote_plus(s3_info.get('object', {}).get('key', ''))
+
+    # Skip files in the /decrypted path to avoid infinite loops
+    if object_key.startswith('decrypted/'):
+        print(f"Skipping file in decrypted folder: {object_key}")
+        return None
+
+    print(f"Processing file: {object_key} from bucket: {bucket_name}")
+
+    # Generate the output key for the decrypted file
+    # Remove any existing file extension and add .dec
+    base_name = os.path.splitext(os.path.basename(object_key))[0]
+    output_key = f"decrypted/{base_name}.dec"
+
+    print(f"Decrypting s3://{bucket_name}/{object_key} to s3://{bucket_name}/{output_key}")
+    # The size comes with the GET, so a small object (the common case) costs
+    # one request; a large one drops this body unread and switches to ranges
+    response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+    body, size = response['Body'], response['ContentLength']
+    if size >= PIPELINE_MIN_BYTES:
+        body.close()
+        # Large object: overlap ranged downloads, decryption and part uploads
+        parts = pipelined_decrypt(s3_client, bucket_name, object_key, output_key, get_cipher(), size)
+        print(f"Uploaded {parts} parts for {object_key}")
+    else:
+        # Stream the encrypted object through the cipher into the upload
+        try:
+            s3_client.upload_fileobj(decrypting_reader(body, get_cipher()), bucket_name, output_key)
+        finally:
+            body.close()
+
+    print(f"Successfully processed {object_key} -> {output_key}")
+    return output_key
+
+
+def s3_records(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # An SQS message carries the S3 notification as JSON in its body (the
+    # s3:TestEvent sent on setup has no Records); a record of a direct S3
+    # notification is itself the S3 record
+    if record.get('eventSource') == 'aws:sqs':
+        return json.loads(record['body']).get('Records', [])
+    return [record]
+
+
+def process_message(s3_client: Any, record: Dict[str, Any]) -> List[str]:
+    """
+    Decrypts every object named by one event record.
+
+    Args:
+        s3_client: S3 client used for the downloads and the uploads
+        record: One entry of the event's Records list, an S3 record or an
+            SQS message wrapping an S3 notification
+
+    Returns:
+        The output keys of the objects that were not skipped
+    """
+    output_keys = []
+    for s3_record in s3_records(record):
+        output_key = process_record(s3_client, s3_record)
+        if output_key is not None:
+            output_keys.append(output_key)
+    return output_keys
+
+
+def record_identifier(record: Dict[str, Any]) -> str:
+    # SQS-delivered records carry a messageId; plain S3 notifications only
+    # the object key
+    if 'messageId' in record:
+        return record['messageId']
+    return unquote_plus(record.get('s3', {}).get('object', {}).get('key', ''))
+
+
+def log_metrics(context: Any, records: int, failures: int, seconds: float) -> None:
+    # One structured line per invocation; nothing when metrics are off
+    snapshot = des.metrics_snapshot()
+    if snapshot is None:
+        return
+    print(json.dumps({
+        'type': 'des_metrics',
+        'request_id': getattr(context, 'aws_request_id', None),
+        'records': records,
+        'failed_records': failures,
+        'invocation_seconds': seconds,
+        **snapshot,
+    }, separators=(',', ':')))
+
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     AWS Lambda handler that processes S3 events for file decryption.
     
     When a file is uploaded to an S3 bucket (excluding /decrypted path),
-    this handler downloads the file, decrypts it using the DES tool,
-    and uploads the decrypted file to the /decrypted folder in the same bucket.
+    this handler streams the object through the in-process DES engine
+    (reading the des binary's file format) and uploads the plaintext to
+    the /decrypted folder in the same bucket, without temporary files. The
+    event is either an S3 notification or an SQS batch whose message bodies
+    are S3 notifications. The records of an event are processed
+    concurrently on up to MAX_WORKERS threads, so one object's network I/O
+    overlaps another's decryption. A failing record does not fail the
+    batch: it is listed in batchItemFailures (by messageId for SQS) and the
+    status code becomes 207. With DES_METRICS set, a JSON metrics line is
+    logged at the end of each invocation.
     
     Args:
-        event: S3 event object containing bucket and key information
+        event: S3 or SQS event object containing bucket and key information
         context: Lambda context object
         
     Returns:
         Dictionary containing status code and JSON response
     """
+    start = time.perf_counter()
     try:
-        # Initialize S3 client
-        s3_client = boto3.client('s3')
-        
-        # Process S3 events
-        for record in event.get('Records', []):
-            # Extract S3 information from the event
-            s3_info = record.get('s3', {})
-            bucket_name = s3_info.get('bucket', {}).get('name')
-            object_key = unquote_plus(s3_info.get('object', {}).get('key', ''))
-            
-            # Skip files in the /decrypted path to avoid infinite loops
-            if object_key.startswith('decrypted/'):
-                print(f"Skipping file in decrypted folder: {object_key}")
-                continue
-            
-            print(f"Processing file: {object_key} from bucket: {bucket_name}")
-            
-            # Create temporary files for processing
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.enc') as encrypted_file:
-                encrypted_path = encrypted_file.name
-                
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.dec') as decrypted_file:
-                decrypted_path = decrypted_file.name
-            
-            try:
-                # Download the encrypted file from S3
-                print(f"Downloading {object_key} from S3...")
-                s3_client.download_file(bucket_name, object_key, encrypted_path)
-                
-                # Run DES decryption
-                print(f"Decrypting file with DES...")
-                des_command = [
-                    '/var/task/des',
-                    '-k', 'my_key',
-                    '-d',
-                    encrypted_path,
-                    decrypted_path
-                ]
-                
-                result = subprocess.run(
-                    des_command,
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
-                
-                if result.returncode != 0:
-                    raise Exception(f"DES decryption failed: {result.stderr}")
-                
-                # Generate the output key for the decrypted file
-                # Remove any existing file extension and add .dec
-                base_name = os.path.splitext(os.path.basename(object_key))[0]
-                output_key = f"decrypted/{base_name}.dec"
-                
-                # Upload the decrypted file to S3
-                print(f"Uploading decrypted file to s3://{bucket_name}/{output_key}")
-                s3_client.upload_file(decrypted_path, bucket_name, output_key)
-                
-                print(f"Successfully processed {object_key} -> {output_key}")
-                
-            finally:
-                # Clean up temporary files
-                try:
-                    os.unlink(encrypted_path)
-                except OSError:
-                    pass
-                try:
-                    os.unlink(decrypted_path)
-                except OSError:
-                    pass
-        
+        s3_client = get_s3_client()
+        records = event.get('Records', [])
+
+        failures = []
+        processed = 0
+        if records:
+            with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(records)))) as pool:
+                futures = [pool.submit(process_message, s3_client, record) for record in records]
+                for record, future in zip(records, futures):
+                    try:
+                        future.result()
+                        processed += 1
+                    except Exception as e:
+                        identifier = record_identifier(record)
+                        print(f"Failed to process {identifier}: {e}")
+                        failures.append({'itemIdentifier': identifier, 'error': str(e)})
+
+        log_metrics(context, len(records), len(failures), time.perf_counter() - start)
         return {
-            'statusCode': 200,
+            'statusCode': 207 if failures else 200,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
+            'batchItemFailures': [{'itemIdentifier': f['itemIdentifier']} for f in failures],
             'body': json.dumps({
-                'message': 'S3 file decryption completed successfully',
-                'processed_files': len(event.get('Records', [])),
+                'message': ('S3 file decryption completed with failures' if failures
+                            else 'S3 file decryption completed successfully'),
+                'processed_files': processed,
+                'failed_files': failures,
                 'event': event
             }, indent=2)
         }
         
-    except subprocess.TimeoutExpired:
-        return {
-            'statusCode': 408,
-            'body': json.dumps({
-                'error': 'DES decryption operation timed out',
-                'details': 'The decryption process took longer than 5 minutes'
-            })
-        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -121,4 +320,4 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'error': 'S3 file decryption failed',
                 'details': str(e)
             })
-        } 
\ No newline at end of file
+        }
@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import des
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(HERE, 'decrypt_file.py')
+KEY = '12345678'
+
+
+def fixture(name):
+    return os.path.join(HERE, name)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def encrypt(cipher, data, mode='des1-cbc'):
+    encryptor = cipher.encryptor(mode)
+    return encryptor.update(data) + encryptor.finalize()
+
+
+def run_script(*args, cwd):
+    env = dict(os.environ, PYTHONPATH=HERE)
+    return subprocess.run([sys.executable, SCRIPT, '-k', KEY, *args], cwd=cwd, env=env,
+                          capture_output=True, text=True)
+
+
+class BatchTest(unittest.TestCase):
+
+    def test_rerun_in_same_directory(self):
+        # With the default --output-dir ., the second run finds the first
+        # run's .dec files next to the inputs and must skip them, not fail
+        cipher = des.DES(KEY)
+        plaintexts = {f'f{i}': os.urandom(100 * i + 3) for i in range(3)}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, data in plaintexts.items():
+                with open(os.path.join(tmp, f'{name}.enc'), 'wb') as f:
+                    f.write(encrypt(cipher, data))
+
+            first = run_script('--batch', '.', '--skip-up-to-date', cwd=tmp)
+            self.assertEqual(first.returncode, 0, first.stderr)
+            self.assertIn('Decrypted 3 files', first.stdout)
+            for name, data in plaintexts.items():
+                self.assertEqual(read(os.path.join(tmp, f'{name}.dec')), data)
+
+            second = run_script('--batch', '.', '--skip-up-to-date', cwd=tmp)
+            self.assertEqual(second.returncode, 0, second.stderr)
+            self.assertIn('Decrypted 0 files', second.stdout)
+            self.assertIn('skipped 3 up to date', second.stdout)
+
+    def test_manifest_clash(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            open(os.path.join(tmp, 'a.enc'), 'wb').close()
+            with open(os.path.join(tmp, 'jobs.txt'), 'w') as f:
+                f.write('a.enc\ta.enc\n')
+            result = run_script('--manifest', 'jobs.txt', cwd=tmp)
+            self.assertEqual(result.returncode, 1)
+            self.assertIn('jobs.txt:1', result.stderr)
+
+
+class SingleFileTest(unittest.TestCase):
+    # The repo's fixtures were written by the des binary
+
+    def check(self, *args, source, expected):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, 'out')
+            result = run_script(*args, fixture(source), out, cwd=tmp)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(read(out), read(fixture(expected)))
+
+    def test_default_mode(self):
+        self.check(source='test_input.enc', expected='test_input.txt')
+
+    def test_mmap(self):
+        self.check('--mmap', source='test_input.enc', expected='test_input.txt')
+
+    def test_failed_mmap_keeps_old_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, 'out')
+            with open(out, 'wb') as f:
+                f.write(b'old')
+            bad = os.path.join(tmp, 'bad.enc')
+            with open(bad, 'wb') as f:
+                f.write(des.DES('otherkey').encrypt_ecb(b'x' * 20))
+            result = run_script('--mmap', '--mode', 'ecb', bad, out, cwd=tmp)
+            self.assertEqual(result.returncode, 1)
+            self.assertEqual(read(out), b'old')
+            self.assertEqual(sorted(os.listdir(tmp)), ['bad.enc', 'out'])
+
+    def test_des1_ecb(self):
+        self.check('--mode', 'des1-ecb', source='single_block_input.enc',
+                   expected='single_block_input.txt')
+
+    def test_ecb(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source, out = os.path.join(tmp, 'in.enc'), os.path.join(tmp, 'out')
+            with open(source, 'wb') as f:
+                f.write(des.DES(KEY).encrypt_ecb(b'plain ECB'))
+            result = run_script('--mode', 'ecb', source, out, cwd=tmp)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(read(out), b'plain ECB')
+
+
+if __name__ == '__main__':
+    unittest.main()
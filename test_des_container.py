@@ -0,0 +1,52 @@
+import io
+import os
+import unittest
+
+import des_container
+
+KEY = '12345678'
+
+
+def pack(data, chunk_size=64):
+    f = io.BytesIO()
+    with des_container.ContainerWriter(f, KEY, chunk_size=chunk_size) as writer:
+        writer.write(data)
+    return f.getvalue()
+
+
+class DamagedContainerTest(unittest.TestCase):
+
+    def assert_rejected(self, data):
+        with self.assertRaises(ValueError):
+            des_container.ContainerReader(io.BytesIO(data), KEY)
+
+    def test_round_trip(self):
+        data = os.urandom(300)
+        reader = des_container.ContainerReader(io.BytesIO(pack(data)), KEY)
+        self.assertEqual(reader.read_range(0, len(data)), data)
+
+    def test_short_files(self):
+        good = pack(b'x' * 100)
+        for data in (b'', good[:10], good[:-5]):
+            self.assert_rejected(data)
+
+    def test_aborted_writer(self):
+        # Header only: the writer left no index and no trailer
+        f = io.BytesIO()
+        with self.assertRaises(RuntimeError):
+            with des_container.ContainerWriter(f, KEY, chunk_size=64):
+                raise RuntimeError
+        self.assert_rejected(f.getvalue())
+
+    def test_bad_index(self):
+        good = pack(os.urandom(300))
+        trailer = des_container._TRAILER
+        index_offset, count, size, magic = trailer.unpack(good[-trailer.size:])
+        body = good[:-trailer.size]
+        for index_offset, count in ((index_offset, count + 5), (10 ** 9, count), (0, count)):
+            self.assert_rejected(body + trailer.pack(index_offset, count, size, magic))
+        self.assert_rejected(good[:-30] + good[-trailer.size:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import importlib.util
+import io
+import os
+import unittest
+
+import des
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (key, plaintext, ciphertext) from FIPS 46 / NBS validation sets
+VECTORS = [
+    ('133457799bbcdff1', '0123456789abcdef', '85e813540f0ab405'),
+    ('0101010101010101', '95f8a5e5dd31d900', '8000000000000000'),
+    ('0123456789abcdef', '4e6f772069732074', '3fa40e8a984d4815'),
+    ('7ca110454a1a6e57', '01a1d6d039776742', '690f5b0d9a26939b'),
+]
+
+# Key the fixtures were encrypted with by the des binary (des -k 12345678)
+FIXTURE_KEY = '12345678'
+
+
+def fixture(name):
+    with open(os.path.join(HERE, name), 'rb') as f:
+        return f.read()
+
+
+def raw_key_cipher(key_hex, tracer=None):
+    # A DES instance on a raw 8-byte key instead of a string_to_key one
+    cipher = des.DES('', tracer=tracer)
+    cipher.key_cblock = bytearray.fromhex(key_hex)
+    cipher.subkeys = cipher._generate_subkeys()
+    ks = tuple(cipher.subkeys)
+    cipher._enc_ks = ks
+    cipher._dec_ks = tuple(k for i in range(30, -2, -2) for k in ks[i:i + 2])
+    return cipher
+
+
+class BlockVectorTest(unittest.TestCase):
+
+    def check(self, cipher):
+        for key, plaintext, ciphertext in VECTORS:
+            if cipher is None:
+                c = raw_key_cipher(key)
+            else:
+                c = cipher(key)
+            self.assertEqual(c.encrypt(bytes.fromhex(plaintext)).hex(), ciphertext, key)
+            self.assertEqual(c.decrypt(bytes.fromhex(ciphertext)).hex(), plaintext, key)
+
+    def test_fast_core(self):
+        self.check(None)
+
+    def test_traced_core(self):
+        self.check(lambda key: raw_key_cipher(key, des.RingBufferTracer(64)))
+
+
+class DesBinaryFormatTest(unittest.TestCase):
+    # Plaintexts the des binary produced for the repo's fixtures
+
+    def test_cbc_file(self):
+        cipher = des.DES(FIXTURE_KEY)
+        reader = des.DESReader(io.BytesIO(fixture('test_input.enc')), cipher, 'des1-cbc')
+        self.assertEqual(reader.read(), fixture('test_input.txt'))
+
+    def test_ecb_file(self):
+        cipher = des.DES(FIXTURE_KEY)
+        reader = des.DESReader(io.BytesIO(fixture('single_block_input.enc')), cipher, 'des1-ecb')
+        self.assertEqual(reader.read(), fixture('single_block_input.txt'))
+
+    def test_round_trip(self):
+        cipher = des.DES(FIXTURE_KEY)
+        for size in (0, 1, 7, 8, 9, 64):
+            data = os.urandom(size)
+            encryptor = cipher.encryptor('des1-cbc')
+            ciphertext = encryptor.update(data) + encryptor.finalize()
+            self.assertEqual(len(ciphertext), size - size % 8 + 8)
+            decryptor = cipher.decryptor('des1-cbc')
+            self.assertEqual(decryptor.update(ciphertext) + decryptor.finalize(), data)
+
+    @unittest.skipUnless(importlib.util.find_spec('boto3'), "needs boto3")
+    def test_lambda_reader(self):
+        spec = importlib.util.spec_from_file_location(
+            'lambda_function_copy', os.path.join(HERE, 'lambda_function copy.py'))
+        handler = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(handler)
+        reader = handler.decrypting_reader(io.BytesIO(fixture('test_input.enc')),
+                                           des.DES(FIXTURE_KEY))
+        self.assertEqual(reader.read(), fixture('test_input.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()